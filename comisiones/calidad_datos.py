@@ -0,0 +1,164 @@
+import json
+import os
+import pandas as pd
+from particiones import parsear_fechas
+
+# ======================================================
+# === OBL DIGITAL — Calidad de datos y deduplicado   ===
+# ======================================================
+#
+# Las tablas dep_sep_*, dep_rtn_*, ftds_* mensuales y agregadas se
+# solapan. Se normaliza cada fila a (date, id, agent, usd, source,
+# month_name, type) y se indexa por hash (hash_pandas_object → uint64).
+# Solo es duplicado una fila cuya clave ya apareció en OTRA tabla; una
+# repetición dentro de la misma tabla puede ser un segundo depósito real,
+# así que se marca y no se borra. Todo es de tiempo lineal: duplicated()
+# y groupby sobre hashes usan tablas hash, sin ordenar ni comparar pares.
+
+COLUMNA_TABLA = "_tabla"
+CLAVE_DEDUP = ["date", "id", "agent", "usd", "source", "month_name", "type"]
+TOLERANCIA_USD = 5          # |Δusd| para marcar casi-duplicados
+REPORTE_CALIDAD = "CMN_MASTER_calidad.json"
+CSV_CASI_DUPLICADOS = "CMN_MASTER_casi_duplicados.csv"
+CSV_REPETIDOS_TABLA = "CMN_MASTER_repetidos_tabla.csv"
+
+
+def normalizar(df):
+    """Tupla normalizada por fila (texto en minúsculas, fecha ISO, mes real)."""
+    fechas = parsear_fechas(df["date"])
+    fecha_txt = fechas.dt.strftime("%Y-%m-%d").fillna(df["date"].astype(str).str.strip())
+
+    def texto(col):
+        return (
+            df[col].fillna("").astype(str).str.strip()
+            .str.replace(r"\s+", " ", regex=True).str.casefold()
+        )
+
+    # Las tablas agregadas vienen con month_name="PGY": se usa el mes de la
+    # fecha para que choquen con la misma fila de la tabla mensual.
+    mes = df["month_name"].fillna("").astype(str)
+    mes = mes.where(mes != "PGY", fechas.dt.strftime("%b").fillna("PGY"))
+
+    return pd.DataFrame({
+        "date": fecha_txt,
+        "id": pd.to_numeric(df["id"], errors="coerce").fillna(0).astype("int64"),
+        "agent": texto("agent"),
+        "usd": pd.to_numeric(df["usd"], errors="coerce").fillna(0).astype("int64"),
+        "source": texto("source"),
+        "month_name": mes.str.casefold(),
+        "type": texto("type") if "type" in df.columns else "ftd",
+    }, index=df.index)
+
+
+def indice_hash(norm, columnas):
+    return pd.util.hash_pandas_object(norm[columnas], index=False)
+
+
+def solapes_por_tabla(hashes, tablas):
+    """Filas de cada tabla cuya clave exacta también aparece en otra tabla."""
+    pares = pd.DataFrame({"h": hashes.values, "tabla": tablas.values}).drop_duplicates()
+    cruce = pares.merge(pares, on="h", suffixes=("", "_otra"))
+    cruce = cruce[cruce["tabla"] != cruce["tabla_otra"]]
+    matriz = pd.crosstab(cruce["tabla"], cruce["tabla_otra"])
+    return {
+        t: {o: int(n) for o, n in fila.items() if n}
+        for t, fila in matriz.iterrows()
+    }
+
+
+def exportar_marcadas(df, marcadas, ruta):
+    if marcadas.any():
+        df[marcadas].to_csv(ruta, index=False, encoding="utf-8-sig")
+    elif os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def deduplicar(df_master, tolerancia=TOLERANCIA_USD):
+    """
+    Quita duplicados exactos entre tablas: la clave queda en la primera
+    tabla donde aparece (la mensual antes que la agregada) y se borra de
+    las demás. Marca sin borrar las repeticiones dentro de una misma tabla
+    y los casi-duplicados: misma clave salvo usd, con |Δusd| <= tolerancia.
+    Devuelve (df_sin_duplicados, reporte).
+    """
+    tablas = df_master[COLUMNA_TABLA] if COLUMNA_TABLA in df_master.columns \
+        else pd.Series("desconocida", index=df_master.index)
+    norm = normalizar(df_master)
+
+    # --- duplicados exactos entre tablas ---
+    h_exacto = indice_hash(norm, CLAVE_DEDUP)
+    tabla_duena = tablas.groupby(h_exacto.values, sort=False).transform("first")
+    exacto = tablas != tabla_duena
+
+    # --- repeticiones dentro de una misma tabla (se conservan) ---
+    vivos = ~exacto
+    repetido = pd.Series(False, index=df_master.index)
+    repetido[vivos] = pd.DataFrame({"h": h_exacto[vivos], "tabla": tablas[vivos]}).duplicated(keep=False).to_numpy()
+
+    # --- casi-duplicados: misma clave salvo usd y |Δusd| <= tolerancia ---
+    # Buckets de ancho = tolerancia: otro usd distinto del mismo bucket
+    # está a menos de la tolerancia; de los buckets contiguos basta mirar
+    # el mínimo (el de arriba) y el máximo (el de abajo) para decidir.
+    casi = pd.Series(False, index=df_master.index)
+    if tolerancia > 0:
+        usd = pd.to_numeric(df_master.loc[vivos, "usd"], errors="coerce").fillna(0.0)
+        claves = pd.DataFrame({
+            "h": indice_hash(norm, [c for c in CLAVE_DEDUP if c != "usd"])[vivos].values,
+            "bucket": (usd // tolerancia).astype("int64").values,
+            "usd": usd.values,
+        })
+        stats = claves.drop_duplicates().groupby(["h", "bucket"])["usd"].agg(["size", "min", "max"])
+
+        def vecino(delta, col):
+            idx = pd.MultiIndex.from_arrays([claves["h"], claves["bucket"] + delta])
+            return stats[col].reindex(idx).to_numpy()
+
+        x = claves["usd"].to_numpy()
+        casi[vivos] = (
+            (vecino(0, "size") > 1)
+            | (vecino(1, "min") - x <= tolerancia)
+            | (x - vecino(-1, "max") <= tolerancia)
+        )
+
+    # --- reporte ---
+    por_tabla = {}
+    marcas = pd.DataFrame({"tabla": tablas, "exacto": exacto, "repetido": repetido, "casi": casi})
+    for tabla, grupo in marcas.groupby("tabla"):
+        por_tabla[tabla] = {
+            "filas": int(len(grupo)),
+            "duplicados_exactos": int(grupo["exacto"].sum()),
+            "repetidos_en_tabla": int(grupo["repetido"].sum()),
+            "casi_duplicados": int(grupo["casi"].sum()),
+        }
+    for tabla, otras in solapes_por_tabla(h_exacto, tablas).items():
+        por_tabla.setdefault(tabla, {})["solapes"] = otras
+
+    reporte = {
+        "filas_entrada": int(len(df_master)),
+        "duplicados_exactos": int(exacto.sum()),
+        "repetidos_en_tabla": int(repetido.sum()),
+        "casi_duplicados": int(casi.sum()),
+        "filas_salida": int(vivos.sum()),
+        "tolerancia_usd": tolerancia,
+        "tablas": por_tabla,
+    }
+
+    exportar_marcadas(df_master, casi, CSV_CASI_DUPLICADOS)
+    exportar_marcadas(df_master, repetido, CSV_REPETIDOS_TABLA)
+    df_limpio = df_master[vivos].drop(columns=[COLUMNA_TABLA], errors="ignore").reset_index(drop=True)
+    return df_limpio, reporte
+
+
+def guardar_reporte(reporte, ruta=REPORTE_CALIDAD):
+    with open(ruta, "w", encoding="utf-8") as fh:
+        json.dump(reporte, fh, ensure_ascii=False, indent=2)
+
+    print(f"\n🧪 Calidad: {reporte['filas_entrada']:,} filas → {reporte['filas_salida']:,} "
+          f"({reporte['duplicados_exactos']:,} duplicados exactos entre tablas eliminados, "
+          f"{reporte['repetidos_en_tabla']:,} repetidos en su tabla y "
+          f"{reporte['casi_duplicados']:,} casi-duplicados marcados)")
+    for tabla, r in reporte["tablas"].items():
+        solapes = ", ".join(f"{o}: {n}" for o, n in r.get("solapes", {}).items()) or "sin solapes"
+        print(f"   🔸 {tabla}: {r.get('filas', 0):,} filas, {r.get('duplicados_exactos', 0):,} exactos, "
+              f"{r.get('repetidos_en_tabla', 0):,} repetidos, {r.get('casi_duplicados', 0):,} casi — {solapes}")
+    print(f"💾 Reporte de calidad guardado: {ruta}")
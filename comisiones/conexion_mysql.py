@@ -10,11 +10,11 @@ DB_CONFIG = {
     "port": 27508
 }
 
-def crear_conexion():
+def crear_conexion(silencioso=False):
     """Crea y retorna una conexión MySQL válida (Railway)."""
     try:
         conexion = mysql.connector.connect(**DB_CONFIG)
-        if conexion.is_connected():
+        if conexion.is_connected() and not silencioso:
             print("✅ Conectado correctamente a Railway MySQL")
         return conexion
     except Error as e:
@@ -1,25 +1,68 @@
-import re
+import math
+import threading
+from collections import OrderedDict
 import pandas as pd
 import dash
-from dash import html, dcc, Input, Output, dash_table
+from dash import html, dcc, Input, Output, dash_table, ctx, no_update
 import plotly.express as px
 from conexion_mysql import crear_conexion
+from refresco_datos import DatasetVivo, leer_version
+from particiones import leer_particiones, indice_particiones, seleccionar
+from tramos import MotorTramos, pct_tramo_ftd, pct_tramo_rtn
+from respuesta_ligera import configurar_compresion, figura_ligera, pagina_tabla, PLANTILLA_OBL
+from exportar_dashboard import registrar_exportacion, url_exportar
+from esquema_master import conformar, validar, leer_feather, checksum_feather, limpiar_usd
+from trazas import span, trazar_callback, registrar_pagina_debug
 
 # ======================================================
 # === OBL DIGITAL DASHBOARD — COMISIONES POR AGENTE  ===
 # ======================================================
 
+def cargar_feather():
+    """Master conformado del ETL (mapeado en memoria), o None."""
+    try:
+        df, conforme = leer_feather()
+        if df is not None and conforme:
+            return df
+    except Exception as e:
+        print(f"⚠️ Error leyendo Feather: {e}")
+    return None
+
+
 def cargar_datos():
+    # MySQL es la fuente de verdad: el Feather local solo la reemplaza si
+    # trae el checksum de la versión publicada en CMN_MASTER_VERSION.
     try:
         conexion = crear_conexion()
         if conexion:
+            try:
+                _, checksum = leer_version(conexion)
+            except Exception:
+                checksum = None
+            if checksum and checksum == checksum_feather():
+                df = cargar_feather()
+                if df is not None:
+                    conexion.close()
+                    print("🪶 Leyendo master conformado (Feather, versión vigente)...")
+                    return df
+
             print("✅ Leyendo desde Railway MySQL...")
             query = "SELECT * FROM CMN_MASTER_CLEAN"
             df = pd.read_sql(query, conexion)
             conexion.close()
             return df
     except Exception as e:
-        print(f"⚠️ Error conectando a SQL, leyendo CSV local: {e}")
+        print(f"⚠️ Error conectando a SQL, leyendo respaldo local: {e}")
+
+    df = cargar_feather()
+    if df is not None:
+        print("🪶 Leyendo master conformado (Feather)...")
+        return df
+
+    df_part = leer_particiones()
+    if df_part is not None:
+        print("🗂️ Leyendo desde master particionado local...")
+        return df_part
 
     print("📁 Leyendo desde CSV local...")
     return pd.read_csv("CMN_MASTER_preview.csv", dtype=str)
@@ -41,476 +84,235 @@ def cargar_withdrawals():
     return pd.DataFrame(columns=["agent", "usd"])
 
 
-# === Carga base ===
-df = cargar_datos()
-df_withdrawals = cargar_withdrawals()
+TC_DEFAULT = 18.19  # MXN/USD inicial del input
+TAMANO_PAGINA = 10
+TITULOS_CARDS = [
+    "PORCENTAJE COMISIÓN",
+    "VENTAS USD",
+    "BONUS SEMANAL USD",
+    "COMISIÓN USD (TOTAL)",
+    "TOTAL VENTAS (FTDs)",
+]
+MAX_VISTAS_CACHE = 32
 
-df.columns = [c.strip().lower() for c in df.columns]
 
-if "source" not in df.columns:
-    df["source"] = None
-if "type" not in df.columns:
-    df["type"] = "FTD"  # fallback
+def procesar_datos(df, df_withdrawals):
+    """Limpia el master (si hace falta) y calcula FTD/RTN con sus comisiones."""
+    # Solo se valida el esquema: si ya cumple el contrato no se re-limpia
+    if not validar(df):
+        df = conformar(df)
 
-# === Fechas ===
-def convertir_fecha(valor):
-    try:
-        if "/" in valor:
-            return pd.to_datetime(valor, format="%d/%m/%Y", errors="coerce")
-        elif "-" in valor:
-            return pd.to_datetime(str(valor).split(" ")[0], errors="coerce")
-    except Exception:
-        return pd.NaT
-    return pd.NaT
-
-df["date"] = df["date"].astype(str).str.strip().apply(convertir_fecha)
-df = df[df["date"].notna()]
-df["date"] = pd.to_datetime(df["date"], utc=False).dt.tz_localize(None)
-
-# === Limpieza USD ===
-def limpiar_usd(valor):
-    if pd.isna(valor): return 0.0
-    s = str(valor).strip()
-    if s == "": return 0.0
-    s = re.sub(r"[^\d,.\-]", "", s)
-    if "." in s and "," in s:
-        if s.rfind(",") > s.rfind("."):
-            s = s.replace(".", "").replace(",", ".")
-        else:
-            s = s.replace(",", "")
-    elif "," in s and "." not in s:
-        partes = s.split(",")
-        s = s.replace(",", ".") if len(partes[-1]) == 2 else s.replace(",", "")
-    elif s.count(".") > 1:
-        s = s.replace(".", "")
-    try:
-        return float(s)
-    except:
-        return 0.0
-
-df["usd"] = df["usd"].apply(limpiar_usd)
-df_withdrawals["usd"] = df_withdrawals["usd"].apply(limpiar_usd)
-
-# === Texto limpio ===
-for col in ["team", "agent", "country", "affiliate", "source", "id"]:
-    if col in df.columns:
-        df[col] = df[col].astype(str).str.strip().str.title()
-        df[col].replace({"Nan": None, "None": None, "": None}, inplace=True)
-
-# === Comisión progresiva ===
-def porcentaje_tramo_progresivo(n_venta):
-    if 1 <= n_venta <= 3:
-        return 0.10
-    elif 4 <= n_venta <= 7:
-        return 0.17
-    elif 8 <= n_venta <= 12:
-        return 0.19
-    elif 13 <= n_venta <= 17:
-        return 0.22
-    elif 18 <= n_venta <= 21:
-        return 0.25
-    elif n_venta >= 22:
-        return 0.30
-    return 0.0
-
-def porcentaje_rtn_progresivo(usd_total):
-    if usd_total <= 25000:
-        return 0.05
-    elif usd_total <= 50000:
-        return 0.06
-    elif usd_total <= 75000:
-        return 0.075
-    elif usd_total <= 101000:
-        return 0.09
-    elif usd_total <= 151000:
-        return 0.10
-    else:
-        return 0.12
-
-
-# === 🧩 Corrección: reiniciar conteo por mes ===
-df = df.sort_values(["agent", "date"]).reset_index(drop=True)
-
-if not pd.api.types.is_datetime64_any_dtype(df["date"]):
-    df["date"] = pd.to_datetime(df["date"], errors="coerce", dayfirst=True)
-df = df.dropna(subset=["date"])
-
-df["year_month"] = df["date"].dt.to_period("M")
-df["ftd_num"] = df.groupby(["agent", "year_month"]).cumcount() + 1
-
-# === FTD: lógica original (NO SE TOCA) ===
-df.loc[df["type"].str.upper() == "FTD", "comm_pct"] = (
-    df.loc[df["type"].str.upper() == "FTD", "ftd_num"]
-    .apply(porcentaje_tramo_progresivo)
-)
-df.loc[df["type"].str.upper() == "FTD", "usd_neto"] = df["usd"]
-df.loc[df["type"].str.upper() == "FTD", "commission_usd"] = (
-    df["usd"] * df["comm_pct"]
-)
+    df_withdrawals["usd"] = df_withdrawals["usd"].apply(limpiar_usd)
 
-# ==========================
-# RTN → NETO REAL (DEP - WITHDRAWALS)
-# ==========================
-df_rtn = df[df["type"].str.upper() == "RTN"].copy()
-df_rtn = df_rtn.sort_values(["agent", "year_month", "date"]).reset_index(drop=True)
-
-# Withdrawals totales por agente
-withdrawals_map = (
-    df_withdrawals
-    .groupby("agent")["usd"]
-    .sum()
-    .to_dict()
-)
+    # === 🧩 Corrección: reiniciar conteo por mes ===
+    df = df.sort_values(["agent", "date"]).reset_index(drop=True)
 
-# Total depósitos por agente/mes
-total_dep_map = (
-    df_rtn
-    .groupby(["agent", "year_month"])["usd"]
-    .sum()
-    .to_dict()
-)
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"], errors="coerce", dayfirst=True)
+    df = df.dropna(subset=["date"])
 
-def calcular_usd_neto(row):
-    retiro_total = withdrawals_map.get(row["agent"], 0)
-    total_dep = total_dep_map.get((row["agent"], row["year_month"]), 0)
+    df["year_month"] = df["date"].dt.to_period("M")
+    # Solo las FTD se numeran: los depósitos RTN no cuentan como venta
+    es_ftd = df["type"].str.upper() == "FTD"
+    df["ftd_num"] = df[es_ftd].groupby(["agent", "year_month"]).cumcount() + 1
 
-    if total_dep <= 0:
-        return row["usd"]
+    # === FTD: lógica original (NO SE TOCA) ===
+    df.loc[df["type"].str.upper() == "FTD", "comm_pct"] = pct_tramo_ftd(
+        df.loc[df["type"].str.upper() == "FTD", "ftd_num"]
+    )
+    df.loc[df["type"].str.upper() == "FTD", "usd_neto"] = df["usd"]
+    df.loc[df["type"].str.upper() == "FTD", "commission_usd"] = (
+        df["usd"] * df["comm_pct"]
+    )
 
-    proporcion = row["usd"] / total_dep
-    retiro_fila = retiro_total * proporcion
-    return max(row["usd"] - retiro_fila, 0)
+    # ==========================
+    # RTN → NETO REAL (DEP - WITHDRAWALS)
+    # ==========================
+    df_rtn = df[df["type"].str.upper() == "RTN"].copy()
+    df_rtn = df_rtn.sort_values(["agent", "year_month", "date"]).reset_index(drop=True)
+
+    # Withdrawals totales por agente
+    withdrawals_map = (
+        df_withdrawals
+        .groupby("agent")["usd"]
+        .sum()
+        .to_dict()
+    )
 
-df_rtn["usd_neto"] = df_rtn.apply(calcular_usd_neto, axis=1)
+    # Total depósitos por agente/mes
+    total_dep_map = (
+        df_rtn
+        .groupby(["agent", "year_month"])["usd"]
+        .sum()
+        .to_dict()
+    )
 
-# 🔥 TOTAL NETO POR AGENT / MES
-total_neto_mes = (
-    df_rtn
-    .groupby(["agent", "year_month"])["usd_neto"]
-    .sum()
-    .reset_index(name="usd_total_mes")
-)
+    def calcular_usd_neto(row):
+        retiro_total = withdrawals_map.get(row["agent"], 0)
+        total_dep = total_dep_map.get((row["agent"], row["year_month"]), 0)
 
-# Determinar porcentaje ÚNICO por mes
-total_neto_mes["comm_pct"] = total_neto_mes["usd_total_mes"].apply(
-    porcentaje_rtn_progresivo
-)
+        if total_dep <= 0:
+            return row["usd"]
 
-# Unir el porcentaje plano a cada fila
-df_rtn = df_rtn.merge(
-    total_neto_mes[["agent", "year_month", "comm_pct"]],
-    on=["agent", "year_month"],
-    how="left"
-)
+        proporcion = row["usd"] / total_dep
+        retiro_fila = retiro_total * proporcion
+        return max(row["usd"] - retiro_fila, 0)
 
-# 🔒 FIX CRÍTICO
-if "comm_pct" not in df_rtn.columns:
-    df_rtn["comm_pct"] = 0.0
+    df_rtn["usd_neto"] = df_rtn.apply(calcular_usd_neto, axis=1)
 
-df_rtn["comm_pct"] = df_rtn["comm_pct"].fillna(0.0)
+    # 🔥 TOTAL NETO POR AGENT / MES
+    total_neto_mes = (
+        df_rtn
+        .groupby(["agent", "year_month"])["usd_neto"]
+        .sum()
+        .reset_index(name="usd_total_mes")
+    )
 
-# Comisión RTN sobre NETO
-df_rtn["commission_usd"] = df_rtn["usd_neto"] * df_rtn["comm_pct"]
+    # Determinar porcentaje ÚNICO por mes
+    total_neto_mes["comm_pct"] = pct_tramo_rtn(total_neto_mes["usd_total_mes"])
 
+    # Unir el porcentaje plano a cada fila
+    df_rtn = df_rtn.merge(
+        total_neto_mes[["agent", "year_month", "comm_pct"]],
+        on=["agent", "year_month"],
+        how="left"
+    )
 
-# Comisión RTN sobre NETO
-df_rtn["commission_usd"] = df_rtn["usd_neto"] * df_rtn["comm_pct"]
+    # 🔒 FIX CRÍTICO
+    if "comm_pct" not in df_rtn.columns:
+        df_rtn["comm_pct"] = 0.0
 
-# 🔥 FIX DEFINITIVO: reemplazar RTN originales por RTN procesados
+    df_rtn["comm_pct"] = df_rtn["comm_pct"].fillna(0.0)
 
-# Separar FTD intactos
-df_ftd = df[df["type"].str.upper() == "FTD"].copy()
+    # Comisión RTN sobre NETO
+    df_rtn["commission_usd"] = df_rtn["usd_neto"] * df_rtn["comm_pct"]
 
-# Unir FTD + RTN ya calculados
-df = pd.concat([df_ftd, df_rtn], ignore_index=True)
+    # 🔥 FIX DEFINITIVO: reemplazar RTN originales por RTN procesados
 
-# Orden final limpio
-df = df.sort_values(["agent", "date"]).reset_index(drop=True)
+    # Separar FTD intactos
+    df_ftd = df[df["type"].str.upper() == "FTD"].copy()
 
+    # Unir FTD + RTN ya calculados
+    df = pd.concat([df_ftd, df_rtn], ignore_index=True)
 
-def week_of_month(dt):
-    """
-    Calcula la semana del mes (1..5) tomando en cuenta el día
-    de la semana del primer día del mes (similar a tu macro de VBA).
-    """
-    first_day = dt.replace(day=1)
-    # weekday(): lunes=0, domingo=6
-    adjusted_dom = dt.day + first_day.weekday()
-    return int((adjusted_dom - 1) / 7) + 1
+    # Orden final limpio
+    df = df.sort_values(["agent", "date"]).reset_index(drop=True)
+    return df
 
 
-# === App ===
-app = dash.Dash(__name__)
-server = app.server
-app.title = "OBL Digital — Dashboard Comisiones"
-
-# === Layout ===
-app.layout = html.Div(
-    style={"backgroundColor": "#0d0d0d", "color": "#000000", "fontFamily": "Poppins, Arial", "padding": "20px"},
-    children=[
-        html.H1("💰 DASHBOARD COMISIONES POR AGENTE", style={
-            "textAlign": "center",
-            "color": "#D4AF37",
-            "marginBottom": "30px",
-            "fontWeight": "bold"
-        }),
-
-        html.Div(
-            style={"display": "flex", "justifyContent": "space-between"},
-            children=[
-                # === FILTROS ===
-                html.Div(
-                    style={
-                        "width": "25%",
-                        "backgroundColor": "#1a1a1a",
-                        "padding": "20px",
-                        "borderRadius": "12px",
-                        "boxShadow": "0 0 15px rgba(212,175,55,0.3)",
-                        "textAlign": "center"
-                    },
-                    children=[
-                        html.Label("Date Range", style={"color": "#D4AF37", "fontWeight": "bold", "display": "block"}),
-                        dcc.DatePickerRange(
-                            id="filtro-fecha",
-                            start_date=df["date"].min(),
-                            end_date=df["date"].max(),
-                            display_format="YYYY-MM-DD",
-                            minimum_nights=0
-                        ),
-                        html.Br(), html.Br(),
-
-                        html.Label("RTN Agent", style={"color": "#D4AF37", "fontWeight": "bold"}),
-                        dcc.Dropdown(
-                            id="filtro-rtn-agent",
-                            multi=True,
-                            placeholder="Selecciona RTN agent"
-                       ),
-
-                        html.Br(),
-
-                        html.Label("FTD Agent", style={"color": "#D4AF37", "fontWeight": "bold"}),
-                        dcc.Dropdown(
-                            id="filtro-ftd-agent",
-                            multi=True,
-                            placeholder="Selecciona FTD agent"
-                        ),
-
-                        html.Br(),
-
-                        html.Label("Tipo de cambio (MXN/USD)", style={"color": "#D4AF37", "fontWeight": "bold"}),
-                        dcc.Input(
-                            id="input-tc",
-                            type="number",
-                            value=18.19,
-                            min=10, max=25, step=0.01,
-                            style={"width": "120px", "textAlign": "center", "marginTop": "10px"}
-                        ),
-                    ],
-                ),
-
-                # === PANEL PRINCIPAL ===
-                html.Div(
-                    style={"width": "72%"},
-                    children=[
-                        html.Div(
-                            style={"display": "flex", "justifyContent": "space-around", "flexWrap": "wrap", "gap": "10px"},
-                            children=[
-                                html.Div(id="card-porcentaje", style={"flex": "1 1 18%", "minWidth": "200px"}),
-                                html.Div(id="card-usd-ventas", style={"flex": "1 1 18%", "minWidth": "200px"}),
-                                html.Div(id="card-usd-bonus", style={"flex": "1 1 18%", "minWidth": "200px"}),
-                                html.Div(id="card-usd-comision", style={"flex": "1 1 18%", "minWidth": "200px"}),
-                                html.Div(id="card-total-ftd", style={"flex": "1 1 18%", "minWidth": "200px"}),
-                            ],
-                        ),
-                        html.Br(),
-                        dcc.Graph(id="grafico-comision-agent", style={"width": "100%", "height": "400px"}),
-                        html.Br(),
-                        html.H4("📋 Detalle de transacciones y comisiones", style={"color": "#D4AF37"}),
-                        dash_table.DataTable(
-                            id="tabla-detalle",
-                            columns=[
-                                {"name": "DATE", "id": "date"},
-                                {"name": "AGENT", "id": "agent"},
-                                {"name": "TYPE", "id": "type"},
-                                {"name": "TEAM", "id": "team"},
-                                {"name": "COUNTRY", "id": "country"},
-                                {"name": "AFFILIATE", "id": "affiliate"},
-                                {"name": "USD", "id": "usd"},
-                                {"name": "FTD_NUM", "id": "ftd_num"},
-                                {"name": "COMM_PCT", "id": "comm_pct"},
-                                {"name": "COMMISSION_USD", "id": "commission_usd"},
-                            ],
-                            style_table={"overflowX": "auto", "backgroundColor": "#0d0d0d"},
-                            page_size=10,
-                            style_cell={
-                                "textAlign": "center",
-                                "color": "#f2f2f2",
-                                "backgroundColor": "#1a1a1a",
-                                "fontSize": "12px",
-                            },
-                            style_header={"backgroundColor": "#D4AF37", "color": "#000", "fontWeight": "bold"},
-                            sort_action="native",
-                        ),
-                    ],
-                ),
-            ],
-        ),
-    ],
-)
-@app.callback(
-    [
-        Output("filtro-rtn-agent", "options"),
-        Output("filtro-ftd-agent", "options"),
-    ],
-    [
-        Input("filtro-fecha", "start_date"),
-        Input("filtro-fecha", "end_date"),
-    ],
-)
-def actualizar_agentes_por_fecha(start_date, end_date):
-
-    df_f = df.copy()
-
-    if start_date and end_date:
-        df_f = df_f[
-            (df_f["date"] >= pd.to_datetime(start_date)) &
-            (df_f["date"] <= pd.to_datetime(end_date))
-        ]
-
-    rtn_agents = sorted(
-        df_f[df_f["type"].str.upper() == "RTN"]["agent"]
-        .dropna()
-        .unique()
-    )
-
-    ftd_agents = sorted(
-        df_f[df_f["type"].str.upper() == "FTD"]["agent"]
-        .dropna()
-        .unique()
-    )
-
-    return (
-        [{"label": a, "value": a} for a in rtn_agents],
-        [{"label": a, "value": a} for a in ftd_agents],
-    )
-
-
-@app.callback(
-    [
-        Output("card-porcentaje", "children"),
-        Output("card-usd-ventas", "children"),
-        Output("card-usd-bonus", "children"),
-        Output("card-usd-comision", "children"),
-        Output("card-total-ftd", "children"),
-        Output("grafico-comision-agent", "figure"),
-        Output("tabla-detalle", "data"),
-    ],
-    [
-        Input("filtro-rtn-agent", "value"),
-        Input("filtro-ftd-agent", "value"),
-        Input("filtro-fecha", "start_date"),
-        Input("filtro-fecha", "end_date"),
-        Input("input-tc", "value")
-    ],
-)
-def actualizar_dashboard(rtn_agents, ftd_agents, start_date, end_date, tipo_cambio):
-
-    df_filtrado = df.copy()
+# === Vista (cards + gráfico + tabla) para un estado de filtros ===
+def calcular_vista(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio):
+    df = estado["df"]
 
     # === Filtros ===
+    # Poda por partición (mes × tipo × agente): solo se copian las filas
+    # de las particiones que pueden cumplir el filtro.
+    agentes = None
     if rtn_agents or ftd_agents:
         agentes = []
         if rtn_agents:
             agentes += rtn_agents
         if ftd_agents:
             agentes += ftd_agents
-        df_filtrado = df_filtrado[df_filtrado["agent"].isin(agentes)]
 
-    if start_date and end_date:
-        df_filtrado = df_filtrado[
-            (df_filtrado["date"] >= pd.to_datetime(start_date)) &
-            (df_filtrado["date"] <= pd.to_datetime(end_date))
-        ]
-
-        df_filtrado = (
-            df_filtrado
-            .sort_values(["agent", "date"])
-            .reset_index(drop=True)
-        )
+    with span("seleccion_particiones"):
+        if start_date and end_date:
+            df_filtrado = seleccionar(df, estado["indice"], start_date, end_date, agentes)
+        else:
+            df_filtrado = seleccionar(df, estado["indice"], agentes=agentes)
+
+    with span("mascara_fechas"):
+        if start_date and end_date:
+            df_filtrado = df_filtrado[
+                (df_filtrado["date"] >= pd.to_datetime(start_date)) &
+                (df_filtrado["date"] <= pd.to_datetime(end_date))
+            ]
+
+            df_filtrado = (
+                df_filtrado
+                .sort_values(["agent", "date"])
+                .reset_index(drop=True)
+            )
 
     if df_filtrado.empty:
-        fig_vacio = px.scatter(title="Sin datos para mostrar")
-        fig_vacio.update_layout(
-            paper_bgcolor="#0d0d0d",
-            plot_bgcolor="#0d0d0d",
-            font_color="#f2f2f2"
-        )
+        fig_vacio = px.scatter(title="Sin datos para mostrar", template=PLANTILLA_OBL)
         vacio = html.Div("Sin datos", style={"color": "#D4AF37"})
-        return vacio, vacio, vacio, vacio, vacio, fig_vacio, []
+        return {
+            "cards": [vacio] * 5,
+            "resumen": [(titulo, "Sin datos") for titulo in TITULOS_CARDS],
+            "figura": figura_ligera(fig_vacio),
+            "tabla": None,
+            "pagina0": [],
+        }
 
     # ======================
     # BONUS SEMANAL (SOLO FTD)
     # ======================
-    df_bonus = df_filtrado[df_filtrado["type"].str.upper() == "FTD"].copy()
+    with span("bonus_semanal"):
+        df_bonus = df_filtrado[df_filtrado["type"].str.upper() == "FTD"].copy()
 
-    df_bonus["year"] = df_bonus["date"].dt.year
-    df_bonus["month"] = df_bonus["date"].dt.month
+        df_bonus["year"] = df_bonus["date"].dt.year
+        df_bonus["month"] = df_bonus["date"].dt.month
 
-    def week_of_month(dt):
-        first_day = dt.replace(day=1)
-        adjusted = dt.day + first_day.weekday()
-        return int((adjusted - 1) / 7) + 1
+        def week_of_month(dt):
+            first_day = dt.replace(day=1)
+            adjusted = dt.day + first_day.weekday()
+            return int((adjusted - 1) / 7) + 1
 
-    df_bonus["week_month"] = df_bonus["date"].apply(week_of_month)
+        df_bonus["week_month"] = df_bonus["date"].apply(week_of_month)
 
-    df_semana = (
-        df_bonus
-        .groupby(["agent", "year", "month", "week_month"])
-        .size()
-        .reset_index(name="ftds")
-    )
+        df_semana = (
+            df_bonus
+            .groupby(["agent", "year", "month", "week_month"])
+            .size()
+            .reset_index(name="ftds")
+        )
 
-    bonus_total_usd = 0.0
+        bonus_total_usd = 0.0
 
-    for _, row in df_semana.iterrows():
-        ftds = row["ftds"]
-        if ftds >= 15:
-            bonus_total_usd += 150
-        elif ftds >= 5:
-            bonus_total_usd += 1500 / tipo_cambio
-        elif ftds >= 4:
-            bonus_total_usd += 1000 / tipo_cambio
-        elif ftds >= 2:
-            bonus_total_usd += 500 / tipo_cambio
+        for _, row in df_semana.iterrows():
+            ftds = row["ftds"]
+            if ftds >= 15:
+                bonus_total_usd += 150
+            elif ftds >= 5:
+                bonus_total_usd += 1500 / tipo_cambio
+            elif ftds >= 4:
+                bonus_total_usd += 1000 / tipo_cambio
+            elif ftds >= 2:
+                bonus_total_usd += 500 / tipo_cambio
 
-    total_bonus = round(bonus_total_usd, 2)
+        total_bonus = round(bonus_total_usd, 2)
 
     # ======================
     # 🔥 RECALCULO RTN POST-FILTRO (FIX DEFINITIVO)
     # ======================
-    df_rtn_f = df_filtrado[df_filtrado["type"].str.upper() == "RTN"]
-
-    if not df_rtn_f.empty:
-        total_rtn_neto = df_rtn_f["usd_neto"].sum()
-        pct_rtn = porcentaje_rtn_progresivo(total_rtn_neto)
+    # El neto RTN de la ventana sale de los acumulados por agente del motor
+    # de tramos, sin volver a filtrar y sumar las filas RTN.
+    with span("rtn_tramos"):
+        if start_date and end_date:
+            pct_rtn, _ = estado["motor"].pct_rtn(agentes, start_date, end_date)
+        else:
+            pct_rtn, _ = estado["motor"].pct_rtn(agentes)
 
-        df_filtrado.loc[
-            df_filtrado["type"].str.upper() == "RTN", "comm_pct"
-        ] = pct_rtn
+        if pct_rtn is not None:
+            df_filtrado.loc[
+                df_filtrado["type"].str.upper() == "RTN", "comm_pct"
+            ] = pct_rtn
 
-        df_filtrado.loc[
-            df_filtrado["type"].str.upper() == "RTN", "commission_usd"
-        ] = df_filtrado["usd_neto"] * pct_rtn
+            df_filtrado.loc[
+                df_filtrado["type"].str.upper() == "RTN", "commission_usd"
+            ] = df_filtrado["usd_neto"] * pct_rtn
 
     # ======================
     # TOTALES
     # ======================
-    total_usd = df_filtrado["usd_neto"].sum()
-    total_commission = df_filtrado["commission_usd"].sum()
-    total_commission_final = total_commission + total_bonus
-    total_ftd = len(df_filtrado)
+    with span("totales"):
+        total_usd = df_filtrado["usd_neto"].sum()
+        total_commission = df_filtrado["commission_usd"].sum()
+        total_commission_final = total_commission + total_bonus
+        total_ftd = int((df_filtrado["type"].str.upper() == "FTD").sum())
 
-    pct_real = df_filtrado["comm_pct"].max() if not df_filtrado.empty else 0.0
+        pct_real = df_filtrado["comm_pct"].max() if not df_filtrado.empty else 0.0
 
     # ======================
     # CARDS
@@ -532,42 +334,374 @@ def actualizar_dashboard(rtn_agents, ftd_agents, start_date, end_date, tipo_camb
             style=card_style
         )
 
-    fig_agent = px.bar(
-        df_filtrado.groupby("agent", as_index=False)["commission_usd"].sum(),
-        x="agent",
-        y="commission_usd",
-        title="Comisión USD by Agent",
-        color="commission_usd",
-        color_continuous_scale="YlOrBr"
+    with span("figura"):
+        por_agente = df_filtrado.groupby("agent", as_index=False)["commission_usd"].sum()
+        por_agente["commission_usd"] = por_agente["commission_usd"].round(2)
+
+        fig_agent = px.bar(
+            por_agente,
+            x="agent",
+            y="commission_usd",
+            title="Comisión USD by Agent",
+            color="commission_usd",
+            color_continuous_scale="YlOrBr",
+            template=PLANTILLA_OBL,
+        )
+        fig_agent = figura_ligera(fig_agent)
+
+    # La tabla queda numérica (orden correcto); el formato se aplica por página
+    with span("tabla"):
+        df_tabla = df_filtrado[
+            ["date", "agent", "type", "team", "country", "affiliate", "usd", "ftd_num", "comm_pct", "commission_usd"]
+        ].reset_index(drop=True)
+        pagina0 = pagina_tabla(df_tabla, 0, TAMANO_PAGINA)
+
+    # (título, valor) de cada card; el export en servidor usa lo mismo
+    resumen = list(zip(TITULOS_CARDS, [
+        f"{pct_real*100:,.2f}%",
+        f"{total_usd:,.2f}",
+        f"{total_bonus:,.2f}",
+        f"{total_commission_final:,.2f}",
+        f"{total_ftd:,}",
+    ]))
+
+    return {
+        "cards": [card(titulo, valor) for titulo, valor in resumen],
+        "resumen": resumen,
+        "figura": fig_agent,
+        "tabla": df_tabla,
+        "pagina0": pagina0,
+    }
+
+
+def es_vista_default(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio):
+    """Primera carga: sin agentes, rango completo y tipo de cambio por defecto."""
+    if rtn_agents or ftd_agents or tipo_cambio != TC_DEFAULT:
+        return False
+    if not (start_date and end_date):
+        return False
+    return (
+        pd.to_datetime(start_date) == estado["fecha_min"] and
+        pd.to_datetime(end_date) == estado["fecha_max"]
     )
 
-    fig_agent.update_layout(
-        paper_bgcolor="#0d0d0d",
-        plot_bgcolor="#0d0d0d",
-        font_color="#f2f2f2",
-        title_font_color="#D4AF37"
+
+_lock_vistas = threading.Lock()
+
+
+def obtener_vista(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio):
+    """
+    Vista para un estado de filtros: la default precalculada o una LRU
+    pequeña por versión de datos (vive dentro de `estado`, así un refresco
+    la invalida sola). Paginar u ordenar la tabla no recalcula nada.
+    """
+    if es_vista_default(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio):
+        return estado["vista_default"]
+
+    clave = (
+        tuple(sorted(rtn_agents or [])), tuple(sorted(ftd_agents or [])),
+        str(start_date), str(end_date), tipo_cambio,
+    )
+    cache = estado["vistas"]
+    with _lock_vistas:
+        if clave in cache:
+            cache.move_to_end(clave)
+            return cache[clave]
+
+    vista = calcular_vista(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio)
+    with _lock_vistas:
+        cache[clave] = vista
+        while len(cache) > MAX_VISTAS_CACHE:
+            cache.popitem(last=False)
+    return vista
+
+
+def construir_estado():
+    """Carga y procesa el master completo; lo publica DatasetVivo."""
+    df = procesar_datos(cargar_datos(), cargar_withdrawals())
+    estado = {
+        "df": df,
+        "indice": indice_particiones(df),
+        "motor": MotorTramos(df),
+        "fecha_min": df["date"].min(),
+        "fecha_max": df["date"].max(),
+    }
+    # Se calcula aquí (en el hilo de refresco) para que la primera pintura
+    # de cada visitante no pague el cálculo sobre todo el dataset.
+    estado["vista_default"] = calcular_vista(
+        estado, None, None, estado["fecha_min"], estado["fecha_max"], TC_DEFAULT
+    )
+    estado["vistas"] = OrderedDict()
+    return estado
+
+
+# === Carga base (se refresca sola cuando el ETL publica versión nueva) ===
+dataset = DatasetVivo(construir_estado).iniciar()
+
+
+def week_of_month(dt):
+    """
+    Calcula la semana del mes (1..5) tomando en cuenta el día
+    de la semana del primer día del mes (similar a tu macro de VBA).
+    """
+    first_day = dt.replace(day=1)
+    # weekday(): lunes=0, domingo=6
+    adjusted_dom = dt.day + first_day.weekday()
+    return int((adjusted_dom - 1) / 7) + 1
+
+
+# === App ===
+app = dash.Dash(__name__)
+server = app.server
+configurar_compresion(server)
+registrar_exportacion(server, dataset, obtener_vista, pagina_tabla, TC_DEFAULT, TAMANO_PAGINA)
+registrar_pagina_debug(server)
+app.title = "OBL Digital — Dashboard Comisiones"
+
+# === Layout ===
+def construir_layout():
+    """Se evalúa en cada carga de página: el rango de fechas sigue al dataset vigente."""
+    estado = dataset.snapshot()[1]
+
+    return html.Div(
+        style={"backgroundColor": "#0d0d0d", "color": "#000000", "fontFamily": "Poppins, Arial", "padding": "20px"},
+        children=[
+            html.H1("💰 DASHBOARD COMISIONES POR AGENTE", style={
+                "textAlign": "center",
+                "color": "#D4AF37",
+                "marginBottom": "30px",
+                "fontWeight": "bold"
+            }),
+
+            html.Div(
+                style={"display": "flex", "justifyContent": "space-between"},
+                children=[
+                    # === FILTROS ===
+                    html.Div(
+                        style={
+                            "width": "25%",
+                            "backgroundColor": "#1a1a1a",
+                            "padding": "20px",
+                            "borderRadius": "12px",
+                            "boxShadow": "0 0 15px rgba(212,175,55,0.3)",
+                            "textAlign": "center"
+                        },
+                        children=[
+                            html.Label("Date Range", style={"color": "#D4AF37", "fontWeight": "bold", "display": "block"}),
+                            dcc.DatePickerRange(
+                                id="filtro-fecha",
+                                start_date=estado["fecha_min"],
+                                end_date=estado["fecha_max"],
+                                display_format="YYYY-MM-DD",
+                                minimum_nights=0
+                            ),
+                            html.Br(), html.Br(),
+
+                            html.Label("RTN Agent", style={"color": "#D4AF37", "fontWeight": "bold"}),
+                            dcc.Dropdown(
+                                id="filtro-rtn-agent",
+                                multi=True,
+                                placeholder="Selecciona RTN agent"
+                           ),
+
+                            html.Br(),
+
+                            html.Label("FTD Agent", style={"color": "#D4AF37", "fontWeight": "bold"}),
+                            dcc.Dropdown(
+                                id="filtro-ftd-agent",
+                                multi=True,
+                                placeholder="Selecciona FTD agent"
+                            ),
+
+                            html.Br(),
+
+                            html.Label("Tipo de cambio (MXN/USD)", style={"color": "#D4AF37", "fontWeight": "bold"}),
+                            dcc.Input(
+                                id="input-tc",
+                                type="number",
+                                value=TC_DEFAULT,
+                                min=10, max=25, step=0.01,
+                                style={"width": "120px", "textAlign": "center", "marginTop": "10px"}
+                            ),
+                        ],
+                    ),
+
+                    # === PANEL PRINCIPAL ===
+                    html.Div(
+                        style={"width": "72%"},
+                        children=[
+                            html.Div(
+                                style={"display": "flex", "justifyContent": "space-around", "flexWrap": "wrap", "gap": "10px"},
+                                children=[
+                                    html.Div(id="card-porcentaje", style={"flex": "1 1 18%", "minWidth": "200px"}),
+                                    html.Div(id="card-usd-ventas", style={"flex": "1 1 18%", "minWidth": "200px"}),
+                                    html.Div(id="card-usd-bonus", style={"flex": "1 1 18%", "minWidth": "200px"}),
+                                    html.Div(id="card-usd-comision", style={"flex": "1 1 18%", "minWidth": "200px"}),
+                                    html.Div(id="card-total-ftd", style={"flex": "1 1 18%", "minWidth": "200px"}),
+                                ],
+                            ),
+                            html.Br(),
+                            dcc.Graph(id="grafico-comision-agent", style={"width": "100%", "height": "400px"}),
+                            html.Br(),
+                            html.H4("📋 Detalle de transacciones y comisiones", style={"color": "#D4AF37"}),
+                            dash_table.DataTable(
+                                id="tabla-detalle",
+                                columns=[
+                                    {"name": "DATE", "id": "date"},
+                                    {"name": "AGENT", "id": "agent"},
+                                    {"name": "TYPE", "id": "type"},
+                                    {"name": "TEAM", "id": "team"},
+                                    {"name": "COUNTRY", "id": "country"},
+                                    {"name": "AFFILIATE", "id": "affiliate"},
+                                    {"name": "USD", "id": "usd"},
+                                    {"name": "FTD_NUM", "id": "ftd_num"},
+                                    {"name": "COMM_PCT", "id": "comm_pct"},
+                                    {"name": "COMMISSION_USD", "id": "commission_usd"},
+                                ],
+                                style_table={"overflowX": "auto", "backgroundColor": "#0d0d0d"},
+                                page_action="custom",
+                                page_current=0,
+                                page_size=TAMANO_PAGINA,
+                                style_cell={
+                                    "textAlign": "center",
+                                    "color": "#f2f2f2",
+                                    "backgroundColor": "#1a1a1a",
+                                    "fontSize": "12px",
+                                },
+                                style_header={"backgroundColor": "#D4AF37", "color": "#000", "fontWeight": "bold"},
+                                sort_action="custom",
+                                sort_mode="single",
+                                sort_by=[],
+                            ),
+                        ],
+                    ),
+                ],
+            ),
+
+            # URL del export en servidor para los filtros actuales (la lee el script de captura)
+            html.A(
+                id="link-exportar",
+                href=url_exportar(None, None, estado["fecha_min"], estado["fecha_max"], TC_DEFAULT),
+                style={"display": "none"},
+            ),
+        ],
     )
 
-    df_tabla = df_filtrado[
-        ["date", "agent", "type", "team", "country", "affiliate", "usd", "ftd_num", "comm_pct", "commission_usd"]
-    ].copy()
 
-    df_tabla["comm_pct"] = df_tabla["comm_pct"].apply(lambda x: f"{x*100:.2f}%")
-    df_tabla["commission_usd"] = df_tabla["commission_usd"].round(2)
+app.layout = construir_layout
+
+
+@app.callback(
+    [
+        Output("filtro-rtn-agent", "options"),
+        Output("filtro-ftd-agent", "options"),
+    ],
+    [
+        Input("filtro-fecha", "start_date"),
+        Input("filtro-fecha", "end_date"),
+    ],
+)
+@trazar_callback("actualizar_agentes_por_fecha")
+def actualizar_agentes_por_fecha(start_date, end_date):
+
+    estado = dataset.snapshot()[1]
+    df_f = estado["df"]
+
+    if start_date and end_date:
+        # Solo las particiones (mes) que tocan el rango
+        with span("seleccion_particiones"):
+            df_f = seleccionar(df_f, estado["indice"], start_date, end_date)
+        with span("mascara_fechas"):
+            df_f = df_f[
+                (df_f["date"] >= pd.to_datetime(start_date)) &
+                (df_f["date"] <= pd.to_datetime(end_date))
+            ]
+
+    with span("agentes"):
+        rtn_agents = sorted(
+            df_f[df_f["type"].str.upper() == "RTN"]["agent"]
+            .dropna()
+            .unique()
+        )
+
+        ftd_agents = sorted(
+            df_f[df_f["type"].str.upper() == "FTD"]["agent"]
+            .dropna()
+            .unique()
+        )
 
     return (
-        card("PORCENTAJE COMISIÓN", f"{pct_real*100:,.2f}%"),
-        card("VENTAS USD", f"{total_usd:,.2f}"),
-        card("BONUS SEMANAL USD", f"{total_bonus:,.2f}"),
-        card("COMISIÓN USD (TOTAL)", f"{total_commission_final:,.2f}"),
-        card("TOTAL VENTAS (FTDs)", f"{total_ftd:,}"),
-        fig_agent,
-        df_tabla.to_dict("records"),
+        [{"label": a, "value": a} for a in rtn_agents],
+        [{"label": a, "value": a} for a in ftd_agents],
     )
 
 
+@app.callback(
+    [
+        Output("card-porcentaje", "children"),
+        Output("card-usd-ventas", "children"),
+        Output("card-usd-bonus", "children"),
+        Output("card-usd-comision", "children"),
+        Output("card-total-ftd", "children"),
+        Output("grafico-comision-agent", "figure"),
+        Output("tabla-detalle", "data"),
+        Output("tabla-detalle", "page_count"),
+        Output("tabla-detalle", "page_current"),
+    ],
+    [
+        Input("filtro-rtn-agent", "value"),
+        Input("filtro-ftd-agent", "value"),
+        Input("filtro-fecha", "start_date"),
+        Input("filtro-fecha", "end_date"),
+        Input("input-tc", "value"),
+        Input("tabla-detalle", "page_current"),
+        Input("tabla-detalle", "sort_by"),
+    ],
+)
+@trazar_callback("actualizar_dashboard")
+def actualizar_dashboard(rtn_agents, ftd_agents, start_date, end_date, tipo_cambio, page_current, sort_by):
+
+    estado = dataset.snapshot()[1]
+
+    # Vista default precalculada o LRU por versión de datos
+    # (en un acierto de caché no aparecen los spans de calcular_vista)
+    with span("obtener_vista"):
+        vista = obtener_vista(estado, rtn_agents, ftd_agents, start_date, end_date, tipo_cambio)
+
+    # Cambio de página u orden: solo viaja la página nueva
+    if ctx.triggered_id == "tabla-detalle":
+        with span("pagina_tabla"):
+            pagina = pagina_tabla(vista["tabla"], page_current, TAMANO_PAGINA, sort_by)
+        return (no_update,) * 6 + (pagina, no_update, no_update)
+
+    filas = 0 if vista["tabla"] is None else len(vista["tabla"])
+    paginas = max(1, math.ceil(filas / TAMANO_PAGINA))
+    with span("pagina_tabla"):
+        pagina = vista["pagina0"] if not sort_by else pagina_tabla(vista["tabla"], 0, TAMANO_PAGINA, sort_by)
+
+    return (*vista["cards"], vista["figura"], pagina, paginas, 0)
+
+
+
+
+@app.callback(
+    Output("link-exportar", "href"),
+    [
+        Input("filtro-rtn-agent", "value"),
+        Input("filtro-ftd-agent", "value"),
+        Input("filtro-fecha", "start_date"),
+        Input("filtro-fecha", "end_date"),
+        Input("input-tc", "value"),
+        Input("tabla-detalle", "page_current"),
+        Input("tabla-detalle", "sort_by"),
+    ],
+)
+def actualizar_link_exportar(rtn_agents, ftd_agents, start_date, end_date, tipo_cambio, page_current, sort_by):
+    return url_exportar(rtn_agents, ftd_agents, start_date, end_date, tipo_cambio, page_current, sort_by)
+
 
-# === 🔟 Index string para capturar imagen (igual que el otro dashboard) ===
+# === 🔟 Index string para capturar imagen (mismo mensaje que el otro dashboard) ===
+# La imagen la genera el servidor (/exportar) con los filtros actuales.
 app.index_string = '''
 <!DOCTYPE html>
 <html>
@@ -576,7 +710,6 @@ app.index_string = '''
   <title>OBL Digital — Dashboard Comisiones</title>
   {%favicon%}
   {%css%}
-  <script src="https://cdnjs.cloudflare.com/ajax/libs/html2canvas/1.4.1/html2canvas.min.js"></script>
 </head>
 <body>
   {%app_entry%}
@@ -591,8 +724,16 @@ app.index_string = '''
       if (!event.data || event.data.action !== "capture_dashboard") return;
 
       try {
-        const canvas = await html2canvas(document.body, { useCORS: true, scale: 2, backgroundColor: "#0d0d0d" });
-        const imgData = canvas.toDataURL("image/png");
+        const link = document.getElementById("link-exportar");
+        const resp = await fetch(link.getAttribute("href") + "&formato=png");
+        if (!resp.ok) throw new Error("HTTP " + resp.status);
+        const blob = await resp.blob();
+        const imgData = await new Promise((resolve, reject) => {
+          const reader = new FileReader();
+          reader.onload = () => resolve(reader.result);
+          reader.onerror = reject;
+          reader.readAsDataURL(blob);
+        });
 
         window.parent.postMessage({
           action: "capture_image",
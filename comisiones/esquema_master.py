@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# ======================================================
+# === OBL DIGITAL — Contrato del master (ETL ↔ dashboard)
+# ======================================================
+#
+# Columnas y dtypes del master ya limpio, definidos una sola vez. El ETL
+# publica el master conformado en Feather (Arrow IPC sin compresión, se
+# puede mapear en memoria) con la huella del esquema y el checksum del
+# master en la metadata; el dashboard solo compara esa huella y los
+# dtypes, sin recorrer los datos, y usa el checksum para saber si el
+# archivo es la versión publicada en CMN_MASTER_VERSION.
+
+VERSION_ESQUEMA = 1
+
+COLUMNAS = {
+    "date": "datetime64[ns]",
+    "id": "object",
+    "team": "object",
+    "agent": "object",
+    "country": "object",
+    "affiliate": "object",
+    "usd": "float64",
+    "month_name": "object",
+    "source": "object",
+    "type": "object",
+}
+
+COLUMNAS_TEXTO = ["team", "agent", "country", "affiliate", "source", "id"]
+ARCHIVO_FEATHER = "CMN_MASTER.feather"
+CLAVE_METADATA = b"obl_esquema"
+CLAVE_CHECKSUM = b"obl_checksum"
+
+
+def huella_esquema():
+    texto = json.dumps({"version": VERSION_ESQUEMA, "columnas": COLUMNAS}, sort_keys=True)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+# === Fechas ===
+def convertir_fecha(valor):
+    try:
+        if "/" in valor:
+            return pd.to_datetime(valor, format="%d/%m/%Y", errors="coerce")
+        elif "-" in valor:
+            return pd.to_datetime(str(valor).split(" ")[0], errors="coerce")
+    except Exception:
+        return pd.NaT
+    return pd.NaT
+
+# === Limpieza USD ===
+def limpiar_usd(valor):
+    if pd.isna(valor): return 0.0
+    s = str(valor).strip()
+    if s == "": return 0.0
+    s = re.sub(r"[^\d,.\-]", "", s)
+    if "." in s and "," in s:
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    elif "," in s and "." not in s:
+        partes = s.split(",")
+        s = s.replace(",", ".") if len(partes[-1]) == 2 else s.replace(",", "")
+    elif s.count(".") > 1:
+        s = s.replace(".", "")
+    try:
+        return float(s)
+    except:
+        return 0.0
+
+
+def conformar(df):
+    """
+    Lleva cualquier master (MySQL, CSV dtype=str, salida del ETL) al
+    contrato: columnas en minúscula, fecha datetime sin tz, usd float y
+    texto en Title Case con None para vacíos.
+    """
+    df = df.copy()
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    if "source" not in df.columns:
+        df["source"] = None
+    if "type" not in df.columns:
+        df["type"] = "FTD"  # fallback
+    for col in COLUMNAS:
+        if col not in df.columns:
+            df[col] = None
+
+    df["date"] = df["date"].astype(str).str.strip().apply(convertir_fecha)
+    df = df[df["date"].notna()].copy()
+    df["date"] = pd.to_datetime(df["date"], utc=False).dt.tz_localize(None).astype("datetime64[ns]")
+
+    df["usd"] = df["usd"].apply(limpiar_usd).astype("float64")
+
+    # === Texto limpio ===
+    for col in COLUMNAS_TEXTO:
+        df[col] = df[col].astype(str).str.strip().str.title()
+        df[col] = df[col].replace({"Nan": None, "None": None, "": None})
+
+    df["type"] = df["type"].astype(object)
+    df["month_name"] = df["month_name"].astype(object)
+    return df[list(COLUMNAS)].reset_index(drop=True)
+
+
+def validar(df):
+    """Solo esquema (nombres, orden y dtypes); no toca los datos."""
+    if list(df.columns) != list(COLUMNAS):
+        return False
+    return all(str(df[col].dtype) == dtype for col, dtype in COLUMNAS.items())
+
+
+# ==========================
+# FEATHER
+# ==========================
+
+def escribir_feather(df, ruta=ARCHIVO_FEATHER, checksum=None):
+    """
+    Escribe el master conformado (sin compresión: lectura por mmap).
+    `checksum` es el mismo que el ETL publica en CMN_MASTER_VERSION.
+    """
+    if not validar(df):
+        raise ValueError("El master no cumple el esquema; usar conformar() antes de publicar.")
+
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(tabla.schema.metadata or {})
+    metadata[CLAVE_METADATA] = huella_esquema().encode("utf-8")
+    if checksum:
+        metadata[CLAVE_CHECKSUM] = checksum.encode("utf-8")
+    tabla = tabla.replace_schema_metadata(metadata)
+
+    tmp = ruta + ".tmp"
+    feather.write_feather(tabla, tmp, compression="uncompressed")
+    os.replace(tmp, ruta)
+    print(f"🪶 Master conformado publicado: {ruta} ({len(df):,} filas)")
+
+
+def leer_feather(ruta=ARCHIVO_FEATHER):
+    """
+    Devuelve (df, conforme). `conforme` es True si la huella de la metadata
+    coincide con el esquema vigente y los dtypes resultantes también.
+    """
+    if not os.path.exists(ruta):
+        return None, False
+
+    tabla = feather.read_table(ruta, memory_map=True)
+    huella = (tabla.schema.metadata or {}).get(CLAVE_METADATA, b"").decode("utf-8")
+    df = tabla.to_pandas(split_blocks=True)
+    return df, huella == huella_esquema() and validar(df)
+
+
+def checksum_feather(ruta=ARCHIVO_FEATHER):
+    """Checksum del master guardado en el Feather; solo lee el esquema."""
+    if not os.path.exists(ruta):
+        return None
+    with pa.memory_map(ruta) as fuente:
+        metadata = pa.ipc.open_file(fuente).schema.metadata or {}
+    return metadata.get(CLAVE_CHECKSUM, b"").decode("utf-8") or None
@@ -0,0 +1,137 @@
+import io
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from flask import request, send_file
+
+# ======================================================
+# === OBL DIGITAL — Exportación del dashboard (PNG/PDF)
+# ======================================================
+#
+# Reemplaza la captura html2canvas del navegador: el servidor arma una
+# figura con cards + gráfico + página de tabla a partir de la vista ya
+# calculada (caché por versión de datos) y la renderiza con kaleido.
+
+RUTA_EXPORTAR = "/exportar"
+FORMATOS = {"png": "image/png", "pdf": "application/pdf"}
+MAX_RENDERS_CACHE = 16
+ANCHO, ALTO = 1400, 1500
+
+COLUMNAS_TABLA = ["date", "agent", "type", "team", "country", "affiliate", "usd", "ftd_num", "comm_pct", "commission_usd"]
+
+
+def url_exportar(rtn_agents, ftd_agents, start_date, end_date, tipo_cambio, page_current=0, sort_by=None):
+    """URL del export para el estado actual de filtros (la usa el cliente)."""
+    params = {
+        "rtn": rtn_agents or [],
+        "ftd": ftd_agents or [],
+        "desde": start_date or "",
+        "hasta": end_date or "",
+        "tc": tipo_cambio if tipo_cambio is not None else "",
+        "pagina": page_current or 0,
+    }
+    if sort_by:
+        params["orden"] = sort_by[0]["column_id"]
+        params["dir"] = sort_by[0]["direction"]
+    return f"{RUTA_EXPORTAR}?{urlencode(params, doseq=True)}"
+
+
+def componer_figura(vista, pagina):
+    """Figura única con los 3 bloques del dashboard, mismo estilo oscuro."""
+    fig = make_subplots(
+        rows=3, cols=1,
+        row_heights=[0.12, 0.48, 0.40],
+        vertical_spacing=0.04,
+        specs=[[{"type": "table"}], [{"type": "xy"}], [{"type": "table"}]],
+    )
+
+    titulos = [t for t, _ in vista["resumen"]]
+    valores = [[v] for _, v in vista["resumen"]]
+    fig.add_trace(go.Table(
+        header=dict(values=titulos, fill_color="#1a1a1a", font=dict(color="#D4AF37", size=13), height=30),
+        cells=dict(values=valores, fill_color="#1a1a1a", font=dict(color="#FFFFFF", size=20), height=40),
+    ), row=1, col=1)
+
+    fig_vista = vista["figura"]
+    for trace in fig_vista.get("data", []):
+        fig.add_trace(trace, row=2, col=1)
+    coloraxis = fig_vista.get("layout", {}).get("coloraxis")
+    if coloraxis:
+        coloraxis = dict(coloraxis)
+        coloraxis["colorbar"] = dict(coloraxis.get("colorbar", {}), y=0.6, len=0.45)
+        fig.update_layout(coloraxis=coloraxis)
+
+    fig.add_trace(go.Table(
+        header=dict(values=[c.upper() for c in COLUMNAS_TABLA], fill_color="#D4AF37", font=dict(color="#000", size=11)),
+        cells=dict(
+            values=[[fila.get(c) for fila in pagina] for c in COLUMNAS_TABLA],
+            fill_color="#1a1a1a", font=dict(color="#f2f2f2", size=11),
+        ),
+    ), row=3, col=1)
+
+    fig.update_layout(
+        title=dict(text="💰 DASHBOARD COMISIONES POR AGENTE", font=dict(color="#D4AF37", size=22), x=0.5),
+        paper_bgcolor="#0d0d0d",
+        plot_bgcolor="#0d0d0d",
+        font=dict(color="#f2f2f2"),
+        showlegend=False,
+        margin=dict(l=40, r=40, t=70, b=30),
+    )
+    fig.update_xaxes(gridcolor="#333333", row=2, col=1)
+    fig.update_yaxes(gridcolor="#333333", title_text="Comisión USD", row=2, col=1)
+    return fig
+
+
+def registrar_exportacion(server, dataset, obtener_vista, pagina_tabla, tc_default, tamano_pagina):
+    """Registra GET /exportar en el servidor Flask del dashboard."""
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    @server.route(RUTA_EXPORTAR)
+    def exportar():
+        formato = request.args.get("formato", "png").lower()
+        if formato not in FORMATOS:
+            return f"Formato no soportado: {formato}", 400
+
+        rtn = request.args.getlist("rtn") or None
+        ftd = request.args.getlist("ftd") or None
+        desde = request.args.get("desde") or None
+        hasta = request.args.get("hasta") or None
+        try:
+            tc = float(request.args.get("tc") or tc_default)
+            pagina_n = int(request.args.get("pagina", 0))
+        except ValueError:
+            return "Parámetros inválidos", 400
+        orden = request.args.get("orden")
+        sort_by = [{"column_id": orden, "direction": request.args.get("dir", "asc")}] if orden in COLUMNAS_TABLA else None
+
+        version, estado = dataset.snapshot()
+        clave = (
+            version, tuple(sorted(rtn or [])), tuple(sorted(ftd or [])),
+            desde, hasta, tc, pagina_n, orden, request.args.get("dir"), formato,
+        )
+        with lock:
+            contenido = cache.get(clave)
+            if contenido is not None:
+                cache.move_to_end(clave)
+
+        if contenido is None:
+            vista = obtener_vista(estado, rtn, ftd, desde, hasta, tc)
+            pagina = pagina_tabla(vista["tabla"], pagina_n, tamano_pagina, sort_by)
+            fig = componer_figura(vista, pagina)
+            contenido = fig.to_image(format=formato, width=ANCHO, height=ALTO, scale=1)
+            with lock:
+                cache[clave] = contenido
+                while len(cache) > MAX_RENDERS_CACHE:
+                    cache.popitem(last=False)
+
+        return send_file(
+            io.BytesIO(contenido),
+            mimetype=FORMATOS[formato],
+            download_name=f"dashboard_comisiones.{formato}",
+            max_age=0,
+        )
+
+    return exportar
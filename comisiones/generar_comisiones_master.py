@@ -1,5 +1,12 @@
+import hashlib
+import os
+import sys
 import pandas as pd
 from conexion_mysql import crear_conexion
+from particiones import escribir_particiones, leer_manifiesto, DIRECTORIO_PARTICIONES, MANIFIESTO
+from pipeline_etl import PipelineETL, Etapa, estado_archivo
+from calidad_datos import deduplicar, guardar_reporte, COLUMNA_TABLA
+from esquema_master import conformar, escribir_feather, ARCHIVO_FEATHER
 
 # ======================================================
 # === OBL DIGITAL — Generador RTN_MASTER_PGY (affiliate corregido)
@@ -62,11 +69,56 @@ def estandarizar_columnas(df, tabla):
     return df
 
 
-def cargar_tabla(tabla, conexion):
+TABLAS = [
+    "dep_sep_rtn_PGY_2025",
+    "dep_oct_rtn_PGY_2025",
+    "dep_nov_rtn_PGY_2025",
+    "dep_rtn_PGY_2025",
+    "ftds_sep_PGY_2025",
+    "ftds_oct_PGY_2025",
+    "ftds_nov_PGY_2025",
+    "ftds_PGY_2025"
+]
+
+COLUMNAS_FINALES = ["date", "id", "team", "agent", "country", "affiliate", "usd", "month_name", "source", "type"]
+
+
+# ==========================
+# ETAPAS
+# ==========================
+
+def huella_tabla(tabla):
+    """CHECKSUM TABLE en el servidor: detecta cambios sin transferir filas."""
+    conexion = crear_conexion(silencioso=True)
+    if conexion is None:
+        return None
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(f"CHECKSUM TABLE {tabla}")
+        fila = cursor.fetchone()
+        cursor.close()
+        return fila[1] if fila else None
+    finally:
+        conexion.close()
+
+
+def extraer_tabla(tabla):
     print(f"\n===> Leyendo tabla {tabla} ...")
-    df = pd.read_sql(f"SELECT * FROM {tabla}", conexion)
+    conexion = crear_conexion()
+    if conexion is None:
+        raise RuntimeError("No se pudo conectar a Railway.")
+    try:
+        df = pd.read_sql(f"SELECT * FROM {tabla}", conexion)
+    finally:
+        conexion.close()
     print(f"   🔸 Columnas detectadas: {list(df.columns)}")
     print(f"   🔸 Registros brutos: {len(df)}")
+    return df
+
+
+def limpiar_tabla(df, tabla):
+    if df is None or df.empty:
+        return None
 
     df = limpiar_encabezados(df, tabla)
     df = estandarizar_columnas(df, tabla)
@@ -81,70 +133,48 @@ def cargar_tabla(tabla, conexion):
     else:
         df["month_name"] = "PGY"
 
+    # 🔹 Tipo según la tabla de origen (dep_*_rtn_* → RTN, ftds_* → FTD)
+    df["type"] = "RTN" if "rtn" in month_raw else "FTD"
+
     if "source" not in df.columns:
         df["source"] = None
 
     df = df.loc[:, ~df.columns.duplicated()]
     df = df.reset_index(drop=True)
-    print(f"   ✅ Filas válidas: {len(df)}")
+    df.columns = df.columns.astype(str)
+    df[COLUMNA_TABLA] = tabla  # origen, para el reporte de calidad
+    print(f"   ✅ {tabla} — filas válidas: {len(df)}")
     return df
 
 
-def obtener_datos():
-    conexion = crear_conexion()
-    if conexion is None:
-        print("❌ No se pudo conectar a Railway.")
-        return pd.DataFrame()
-
-    tablas = [
-        "dep_sep_rtn_PGY_2025",
-        "dep_oct_rtn_PGY_2025",
-        "dep_nov_rtn_PGY_2025",
-        "dep_rtn_PGY_2025",
-        "ftds_sep_PGY_2025",
-        "ftds_oct_PGY_2025",
-        "ftds_nov_PGY_2025",
-        "ftds_PGY_2025"
-    ]
-
-    dataframes = []
-    for tabla in tablas:
-        try:
-            df = cargar_tabla(tabla, conexion)
-            if not df.empty:
-                dataframes.append(df)
-        except Exception as e:
-            print(f"⚠️ Error procesando {tabla}: {e}")
-
-    conexion.close()
-
+def concatenar(*dataframes):
+    dataframes = [d for d in dataframes if d is not None and not d.empty]
     if not dataframes:
-        print("❌ No se generó CMN_MASTER (sin datos).")
-        return pd.DataFrame()
-
-    for i in range(len(dataframes)):
-        dataframes[i].columns = dataframes[i].columns.astype(str)
-        dataframes[i] = dataframes[i].reset_index(drop=True)
+        raise RuntimeError("No se generó CMN_MASTER (sin datos).")
 
     df_master = pd.concat(dataframes, ignore_index=True, sort=False)
     df_master.dropna(how="all", inplace=True)
     df_master = df_master.reset_index(drop=True)
 
-    columnas_finales = ["date", "id", "team", "agent", "country", "affiliate", "usd", "month_name", "source"]
-    for col in columnas_finales:
+    for col in COLUMNAS_FINALES:
         if col not in df_master.columns:
             df_master[col] = None
 
-    df_master = df_master[columnas_finales]
+    return df_master[COLUMNAS_FINALES + [COLUMNA_TABLA]]
 
+
+def limpiar_master(df_master):
     # 🔹 Limpieza general
     df_master = df_master.applymap(lambda x: str(x).strip() if isinstance(x, str) else x)
     df_master = df_master.replace({"": None, "nan": None, "NaN": None, pd.NA: None, pd.NaT: None})
     df_master = df_master.where(pd.notnull(df_master), None)
     df_master.dropna(subset=["date"], how="any", inplace=True)
-    df_master = df_master.reset_index(drop=True)
+    return df_master.reset_index(drop=True)
+
 
+def convertir_numericos(df_master):
     # 🔹 Conversión numérica (solo enteros)
+    df_master = df_master.copy()
     for col in ["usd", "id"]:
         if col in df_master.columns:
             df_master[col] = (
@@ -154,59 +184,205 @@ def obtener_datos():
             )
 
     print(f"\n📊 CMN_MASTER alineado correctamente con {len(df_master)} registros.")
-    df_master.to_csv("CMN_MASTER_preview.csv", index=False, encoding="utf-8-sig")
-    print("💾 Vista previa guardada: CMN_MASTER_preview.csv")
+    return df_master
+
+
+def deduplicar_master(df_master):
+    # 🔹 Duplicados exactos entre tablas solapadas + reporte de calidad
+    df_limpio, reporte = deduplicar(df_master)
+    guardar_reporte(reporte)
+    return df_limpio
+
+
+CSV_PREVIEW = "CMN_MASTER_preview.csv"
+
+
+def escribir_csv(df_master):
+    df_master.to_csv(CSV_PREVIEW, index=False, encoding="utf-8-sig")
+    print(f"💾 Vista previa guardada: {CSV_PREVIEW}")
+
+
+def publicar_feather(df_master):
+    # 🔹 Master conformado al contrato del dashboard (Arrow IPC / Feather)
+    escribir_feather(conformar(df_master), checksum=checksum_master(df_master))
+
+
+def escribir_master_particionado(df_master):
+    # 🔹 Master particionado (mes × tipo [× bucket de agente]) + manifiesto
+    escribir_particiones(df_master, extra_manifiesto={"checksum": checksum_master(df_master)})
+
+
+def estado_particiones():
+    """Estado del manifiesto; None si falta o si falta alguna partición."""
+    manifiesto = leer_manifiesto()
+    if manifiesto is None:
+        return None
+    for parte in manifiesto["particiones"]:
+        if not os.path.exists(os.path.join(DIRECTORIO_PARTICIONES, parte["ruta"])):
+            return None
+    return estado_archivo(os.path.join(DIRECTORIO_PARTICIONES, MANIFIESTO))
+
+
+def checksum_master(df_master):
+    """Huella sha256 del contenido del master (independiente del índice)."""
+    hashes = pd.util.hash_pandas_object(df_master, index=False).values
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
 
+
+def publicar_version(conexion, df_master):
+    """
+    Incrementa la fila de versión que sondea el dashboard para refrescarse
+    en caliente. Se escribe solo después de que CMN_MASTER_CLEAN está completa.
+    """
+    cursor = conexion.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CMN_MASTER_VERSION (
+            id TINYINT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            filas INT NOT NULL,
+            actualizado DATETIME NOT NULL
+        );
+    """)
+    cursor.execute("""
+        INSERT INTO CMN_MASTER_VERSION (id, version, checksum, filas, actualizado)
+        VALUES (1, 1, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            version = version + 1,
+            checksum = VALUES(checksum),
+            filas = VALUES(filas),
+            actualizado = NOW();
+    """, (checksum_master(df_master), len(df_master)))
+    conexion.commit()
+    cursor.close()
+    print("🔖 Versión de CMN_MASTER publicada para el dashboard.")
+
+
+def cargar_mysql(df_master):
     # ==========================================================
     # === CARGA DIRECTA A MYSQL RAILWAY ========================
     # ==========================================================
+    conexion = crear_conexion()
+    if conexion is None:
+        raise RuntimeError("No se pudo abrir conexión para escribir en Railway.")
+
+    cursor = conexion.cursor()
+
+    # Se carga en una tabla temporal y luego se intercambia con RENAME
+    # (atómico): el dashboard nunca lee una tabla a medio poblar.
+    cursor.execute("DROP TABLE IF EXISTS CMN_MASTER_CLEAN_tmp;")
+    cursor.execute("""
+        CREATE TABLE CMN_MASTER_CLEAN_tmp (
+            date TEXT,
+            id INT,
+            team TEXT,
+            agent TEXT,
+            country TEXT,
+            affiliate TEXT,
+            usd INT,
+            month_name TEXT,
+            source TEXT,
+            type VARCHAR(3)
+        );
+    """)
+    conexion.commit()
+
+    insert_sql = f"""
+        INSERT INTO CMN_MASTER_CLEAN_tmp
+        ({", ".join(COLUMNAS_FINALES)})
+        VALUES ({", ".join(["%s"] * len(COLUMNAS_FINALES))})
+    """
+
+    data = [
+        tuple(None if pd.isna(v) else v for v in fila)
+        for fila in df_master[COLUMNAS_FINALES].itertuples(index=False, name=None)
+    ]
+
+    cursor.executemany(insert_sql, data)
+    conexion.commit()
+
+    cursor.execute("CREATE TABLE IF NOT EXISTS CMN_MASTER_CLEAN (id INT);")
+    cursor.execute("""
+        RENAME TABLE CMN_MASTER_CLEAN TO CMN_MASTER_CLEAN_old,
+                     CMN_MASTER_CLEAN_tmp TO CMN_MASTER_CLEAN;
+    """)
+    cursor.execute("DROP TABLE IF EXISTS CMN_MASTER_CLEAN_old;")
+    conexion.commit()
+
+    publicar_version(conexion, df_master)
+    conexion.close()
+
+    print("✅ CMN_MASTER_CLEAN creada y poblada correctamente en Railway (affiliate corregido y enteros).")
+
+
+# ==========================
+# PIPELINE
+# ==========================
+
+def construir_pipeline(forzar=False):
+    """
+    extraer:<tabla> → limpiar:<tabla>  (por tabla, en paralelo)
+    → concatenar → limpiar_master → convertir_numericos → deduplicar
+    → escribir_csv / escribir_feather / escribir_particiones / cargar_mysql
+    """
+    pipeline = PipelineETL(forzar=forzar)
+
+    for tabla in TABLAS:
+        pipeline.agregar(Etapa(
+            f"extraer:{tabla}",
+            lambda tabla=tabla: extraer_tabla(tabla),
+            huella=lambda tabla=tabla: huella_tabla(tabla),
+            opcional=True,
+        ))
+        pipeline.agregar(Etapa(
+            f"limpiar:{tabla}",
+            lambda df, tabla=tabla: limpiar_tabla(df, tabla),
+            entradas=[f"extraer:{tabla}"],
+            version=3,
+            opcional=True,
+        ))
+
+    pipeline.agregar(Etapa("concatenar", concatenar, entradas=[f"limpiar:{t}" for t in TABLAS], version=2))
+    pipeline.agregar(Etapa("limpiar_master", limpiar_master, entradas=["concatenar"]))
+    pipeline.agregar(Etapa("convertir_numericos", convertir_numericos, entradas=["limpiar_master"]))
+    pipeline.agregar(Etapa("deduplicar", deduplicar_master, entradas=["convertir_numericos"]))
+    # Las etapas de escritura se repiten si su destino ya no está como lo dejaron
+    pipeline.agregar(Etapa(
+        "escribir_csv", escribir_csv, entradas=["deduplicar"], opcional=True,
+        destino=lambda: estado_archivo(CSV_PREVIEW),
+    ))
+    pipeline.agregar(Etapa(
+        "escribir_feather", publicar_feather, entradas=["deduplicar"], version=2, opcional=True,
+        destino=lambda: estado_archivo(ARCHIVO_FEATHER),
+    ))
+    pipeline.agregar(Etapa(
+        "escribir_particiones", escribir_master_particionado, entradas=["deduplicar"], opcional=True,
+        destino=estado_particiones,
+    ))
+    # MySQL va al final: su fila de versión dispara el refresco del dashboard,
+    # que para entonces ya encuentra Feather/particiones/CSV nuevos.
+    pipeline.agregar(Etapa(
+        "cargar_mysql",
+        lambda df, *_: cargar_mysql(df),
+        entradas=["deduplicar", "escribir_csv", "escribir_feather", "escribir_particiones"],
+        version=2,
+        opcional=True,
+        destino=lambda: huella_tabla("CMN_MASTER_CLEAN"),
+    ))
+    return pipeline
+
+
+def obtener_datos(forzar=False):
+    pipeline = construir_pipeline(forzar=forzar)
     try:
-        conexion = crear_conexion()
-        if conexion:
-            cursor = conexion.cursor()
-
-            cursor.execute("DROP TABLE IF EXISTS CMN_MASTER_CLEAN;")
-            cursor.execute("""
-                CREATE TABLE CMN_MASTER_CLEAN (
-                    date TEXT,
-                    id INT,
-                    team TEXT,
-                    agent TEXT,
-                    country TEXT,
-                    affiliate TEXT,
-                    usd INT,
-                    month_name TEXT,
-                    source TEXT
-                );
-            """)
-            conexion.commit()
-
-            columnas = ["date", "id", "team", "agent", "country", "affiliate", "usd", "month_name", "source"]
-
-            insert_sql = f"""
-                INSERT INTO CMN_MASTER_CLEAN
-                ({", ".join(columnas)})
-                VALUES ({", ".join(["%s"] * len(columnas))})
-            """
-
-            data = [
-                tuple(row.get(c) for c in columnas)
-                for _, row in df_master.iterrows()
-            ]
-
-            cursor.executemany(insert_sql, data)
-            conexion.commit()
-            conexion.close()
-
-            print("✅ CMN_MASTER_CLEAN creada y poblada correctamente en Railway (affiliate corregido y enteros).")
-        else:
-            print("⚠️ No se pudo abrir conexión para escribir en Railway.")
-    except Exception as e:
-        print(f"⚠️ Error al crear CMN_MASTER_CLEAN: {e}")
-    return df_master
+        df_master = pipeline.ejecutar("deduplicar")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return pd.DataFrame()
+    return df_master if df_master is not None else pd.DataFrame()
 
 
 if __name__ == "__main__":
-    df = obtener_datos()
+    df = obtener_datos(forzar="--forzar" in sys.argv)
     print("\nPrimeras filas de CMN_MASTER:")
     print(df.head())
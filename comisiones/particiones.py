@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# === OBL DIGITAL — Master particionado (mes × tipo × agente)
+# ======================================================
+#
+# Estructura en disco:
+#   CMN_MASTER_particiones/
+#       manifest.json
+#       month=2025-09/type=FTD/part-00.csv
+#       month=2025-09/type=RTN/part-03.csv
+#
+# El manifiesto guarda por partición fecha mínima/máxima y la lista de
+# agentes, así los lectores descartan archivos sin abrirlos.
+
+DIRECTORIO_PARTICIONES = "CMN_MASTER_particiones"
+MANIFIESTO = "manifest.json"
+BUCKETS_AGENTE = int(os.environ.get("BUCKETS_AGENTE", "0"))  # 0 = sin hash por agente
+MES_DESCONOCIDO = "desconocido"
+
+
+def normalizar_agente(agente):
+    return str(agente).strip().casefold()
+
+
+def bucket_agente(agente, buckets):
+    """Bucket estable (crc32, no depende de PYTHONHASHSEED)."""
+    if not buckets:
+        return 0
+    return zlib.crc32(normalizar_agente(agente).encode("utf-8")) % buckets
+
+
+def parsear_fechas(serie):
+    """Misma regla que el dashboard: dd/mm/yyyy con '/' y ISO con '-'."""
+    s = serie.astype(str).str.strip()
+    con_barra = s.str.contains("/", regex=False)
+    fechas = pd.to_datetime(s.where(~con_barra).str.split(" ").str[0], errors="coerce")
+    fechas[con_barra] = pd.to_datetime(s[con_barra], format="%d/%m/%Y", errors="coerce")
+    return fechas
+
+
+# ==========================
+# ESCRITURA (ETL)
+# ==========================
+
+def escribir_particiones(df_master, directorio=DIRECTORIO_PARTICIONES, buckets=BUCKETS_AGENTE, extra_manifiesto=None):
+    """
+    Escribe el master como dataset particionado + manifiesto.
+    Se arma en un directorio temporal y se intercambia al final, así un
+    lector nunca ve un manifiesto que apunte a archivos incompletos.
+    """
+    tmp = directorio + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    fechas = parsear_fechas(df_master["date"])
+    meses = fechas.dt.strftime("%Y-%m").fillna(MES_DESCONOCIDO)
+    tipos = df_master["type"].fillna("FTD").astype(str).str.upper() if "type" in df_master.columns \
+        else pd.Series("FTD", index=df_master.index)
+    agentes = df_master["agent"].fillna("")
+    bucket = agentes.map(lambda a: bucket_agente(a, buckets))
+
+    entradas = []
+    for (mes, tipo, b), idx in df_master.groupby([meses, tipos, bucket], sort=True).groups.items():
+        parte = df_master.loc[idx]
+        ruta = os.path.join(f"month={mes}", f"type={tipo}", f"part-{b:02d}.csv")
+        os.makedirs(os.path.join(tmp, os.path.dirname(ruta)), exist_ok=True)
+        parte.to_csv(os.path.join(tmp, ruta), index=False, encoding="utf-8-sig")
+
+        f = fechas.loc[idx]
+        entradas.append({
+            "ruta": ruta,
+            "mes": mes,
+            "tipo": tipo,
+            "bucket": int(b),
+            "filas": int(len(parte)),
+            "bytes": os.path.getsize(os.path.join(tmp, ruta)),
+            "fecha_min": None if f.isna().all() else f.min().strftime("%Y-%m-%d"),
+            "fecha_max": None if f.isna().all() else f.max().strftime("%Y-%m-%d"),
+            "agentes": sorted({normalizar_agente(a) for a in parte["agent"].dropna()}),
+        })
+
+    manifiesto = {"buckets": buckets, "filas": int(len(df_master)), "particiones": entradas}
+    if extra_manifiesto:
+        manifiesto.update(extra_manifiesto)
+    with open(os.path.join(tmp, MANIFIESTO), "w", encoding="utf-8") as fh:
+        json.dump(manifiesto, fh, ensure_ascii=False, indent=1)
+
+    viejo = directorio + ".old"
+    shutil.rmtree(viejo, ignore_errors=True)
+    if os.path.exists(directorio):
+        os.replace(directorio, viejo)
+    os.replace(tmp, directorio)
+    shutil.rmtree(viejo, ignore_errors=True)
+
+    print(f"🗂️ Master particionado en {directorio}: {len(entradas)} particiones.")
+    return manifiesto
+
+
+# ==========================
+# LECTURA CON PODA
+# ==========================
+
+def leer_manifiesto(directorio=DIRECTORIO_PARTICIONES):
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def podar(manifiesto, desde=None, hasta=None, agentes=None, tipos=None):
+    """Particiones que pueden contener filas para los filtros dados."""
+    desde = pd.to_datetime(desde).strftime("%Y-%m-%d") if desde else None
+    hasta = pd.to_datetime(hasta).strftime("%Y-%m-%d") if hasta else None
+    tipos = {t.upper() for t in tipos} if tipos else None
+    agentes = {normalizar_agente(a) for a in agentes} if agentes else None
+    buckets = manifiesto.get("buckets", 0)
+    buckets_validos = {bucket_agente(a, buckets) for a in agentes} if agentes else None
+
+    elegidas = []
+    for p in manifiesto["particiones"]:
+        if tipos and p["tipo"] not in tipos:
+            continue
+        if desde or hasta:
+            if p["fecha_min"] is None:
+                continue
+            if desde and p["fecha_max"] < desde:
+                continue
+            if hasta and p["fecha_min"] > hasta:
+                continue
+        if agentes:
+            if p["bucket"] not in buckets_validos:
+                continue
+            if agentes.isdisjoint(p["agentes"]):
+                continue
+        elegidas.append(p)
+    return elegidas
+
+
+def leer_particiones(directorio=DIRECTORIO_PARTICIONES, desde=None, hasta=None, agentes=None, tipos=None, stats=None):
+    """
+    Lee solo las particiones que sobreviven a la poda (como texto, igual que
+    el CSV de vista previa). Si se pasa `stats` (dict) se llena con
+    archivos/bytes/filas leídos.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    if manifiesto is None:
+        return None
+
+    elegidas = podar(manifiesto, desde, hasta, agentes, tipos)
+    partes = [
+        pd.read_csv(os.path.join(directorio, p["ruta"]), dtype=str, encoding="utf-8-sig")
+        for p in elegidas
+    ]
+    if stats is not None:
+        stats.update({
+            "archivos": len(elegidas),
+            "archivos_total": len(manifiesto["particiones"]),
+            "bytes": sum(p["bytes"] for p in elegidas),
+            "bytes_total": sum(p["bytes"] for p in manifiesto["particiones"]),
+        })
+    if not partes:
+        return pd.DataFrame(columns=["date", "id", "team", "agent", "country", "affiliate", "usd", "month_name", "source", "type"])
+    return pd.concat(partes, ignore_index=True)
+
+
+# ==========================
+# ÍNDICE EN MEMORIA (DASHBOARD)
+# ==========================
+
+def indice_particiones(df):
+    """
+    Índice (year_month, TYPE, agent) -> posiciones del frame procesado.
+    Los callbacks toman solo las posiciones de las particiones que tocan
+    el filtro en vez de copiar y enmascarar el frame completo.
+    """
+    tipos = df["type"].astype(str).str.upper()
+    return df.groupby([df["year_month"], tipos, df["agent"].fillna("")], sort=False).indices
+
+
+def seleccionar(df, indice, desde=None, hasta=None, agentes=None, tipos=None):
+    """Subconjunto (copia) de `df` para las particiones que cubren el filtro."""
+    mes_desde = pd.Period(pd.to_datetime(desde), "M") if desde else None
+    mes_hasta = pd.Period(pd.to_datetime(hasta), "M") if hasta else None
+    agentes = set(agentes) if agentes else None
+    tipos = {t.upper() for t in tipos} if tipos else None
+
+    posiciones = [
+        pos for (mes, tipo, agente), pos in indice.items()
+        if (mes_desde is None or mes >= mes_desde)
+        and (mes_hasta is None or mes <= mes_hasta)
+        and (agentes is None or agente in agentes)
+        and (tipos is None or tipo in tipos)
+    ]
+    if not posiciones:
+        return df.iloc[0:0].copy()
+    return df.take(np.sort(np.concatenate(posiciones)))
+
+
+# ==========================
+# MEDICIÓN: un agente, un mes
+# ==========================
+
+def medir(agente, mes, directorio=DIRECTORIO_PARTICIONES, repeticiones=5):
+    """Compara lectura completa vs. lectura podada para un agente/mes."""
+    periodo = pd.Period(mes, "M")
+    desde, hasta = periodo.start_time, periodo.end_time
+
+    def cronometrar(**filtros):
+        stats = {}
+        t0 = time.perf_counter()
+        for _ in range(repeticiones):
+            df = leer_particiones(directorio, stats=stats, **filtros)
+        ms = (time.perf_counter() - t0) * 1000 / repeticiones
+        return df, stats, ms
+
+    df_full, st_full, ms_full = cronometrar()
+    df_pod, st_pod, ms_pod = cronometrar(desde=desde, hasta=hasta, agentes=[agente])
+    filas_agente = (df_pod["agent"].map(normalizar_agente) == normalizar_agente(agente)).sum()
+
+    print(f"📏 Lectura completa : {st_full['archivos']} archivos, {st_full['bytes']:,} bytes, {len(df_full):,} filas, {ms_full:.1f} ms")
+    print(f"📏 Lectura podada   : {st_pod['archivos']} archivos, {st_pod['bytes']:,} bytes, {len(df_pod):,} filas ({filas_agente} del agente), {ms_pod:.1f} ms")
+    if st_full["bytes"]:
+        print(f"   ➜ I/O {100 * (1 - st_pod['bytes'] / st_full['bytes']):.1f}% menos, "
+              f"latencia x{ms_full / max(ms_pod, 1e-6):.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python particiones.py \"<agente>\" YYYY-MM")
+        sys.exit(1)
+    medir(sys.argv[1], sys.argv[2])
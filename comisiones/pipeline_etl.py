@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# ======================================================
+# === OBL DIGITAL — Runner de etapas con checkpoints ===
+# ======================================================
+#
+# Cada etapa declara sus entradas (otras etapas). Su clave es el hash de:
+# nombre + versión + hashes de contenido de sus entradas + huella externa
+# opcional (p. ej. CHECKSUM TABLE de MySQL). Si la clave coincide con la
+# del checkpoint guardado la etapa se omite; la salida solo se lee del
+# disco si alguna etapa posterior la necesita.
+#
+# Las etapas que escriben fuera del pipeline (CSV, Feather, particiones,
+# MySQL) declaran además `destino`: el estado de lo que escriben, tomado
+# justo después de correr. Si al volver ese estado no coincide (archivo
+# borrado o tocado, tabla eliminada) la etapa se repite aunque la clave
+# sea la misma.
+
+DIRECTORIO_CHECKPOINTS = ".checkpoints"
+
+
+def estado_archivo(ruta):
+    """Estado de un archivo escrito por una etapa (None si no existe)."""
+    if not os.path.exists(ruta):
+        return None
+    st = os.stat(ruta)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def huella_contenido(obj):
+    """sha256 del contenido: DataFrames vía hash_pandas_object, resto vía pickle."""
+    h = hashlib.sha256()
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode("utf-8"))
+        h.update(repr([str(t) for t in obj.dtypes]).encode("utf-8"))
+        try:
+            h.update(pd.util.hash_pandas_object(obj, index=False).values.tobytes())
+        except TypeError:
+            h.update(pickle.dumps(obj.values.tolist()))
+    else:
+        h.update(pickle.dumps(obj))
+    return h.hexdigest()
+
+
+class Etapa:
+    def __init__(self, nombre, funcion, entradas=(), huella=None, version=1, opcional=False, destino=None):
+        self.nombre = nombre
+        self.funcion = funcion        # recibe las salidas de `entradas` en orden
+        self.entradas = list(entradas)
+        self.huella = huella          # callable sin argumentos -> str (estado externo)
+        self.version = version        # subir cuando cambia la lógica de la etapa
+        self.opcional = opcional      # si falla, sigue el pipeline con salida None
+        self.destino = destino        # callable sin argumentos -> str (lo que escribe la etapa)
+
+
+class PipelineETL:
+    def __init__(self, directorio=DIRECTORIO_CHECKPOINTS, max_workers=4, forzar=False):
+        self.directorio = directorio
+        self.max_workers = max_workers
+        self.forzar = forzar
+        self.etapas = {}
+        self.metricas = []
+        self._salidas = {}      # nombre -> objeto en memoria
+        self._huellas = {}      # nombre -> hash de contenido de la salida
+        self._lock = threading.RLock()
+        os.makedirs(directorio, exist_ok=True)
+
+    def agregar(self, etapa):
+        self.etapas[etapa.nombre] = etapa
+        return etapa
+
+    # --- checkpoints ---
+    def _ruta(self, nombre, ext):
+        return os.path.join(self.directorio, nombre.replace(":", "__") + ext)
+
+    def _leer_meta(self, nombre):
+        try:
+            with open(self._ruta(nombre, ".json"), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _guardar(self, nombre, clave, salida, huella, filas, destino):
+        """
+        Pickle y meta se escriben aparte y se reemplazan con os.replace; el
+        meta va último (y el viejo se borra antes), así un corte a mitad
+        nunca deja un meta válido apuntando a un pickle truncado.
+        """
+        ruta_pkl, ruta_meta = self._ruta(nombre, ".pkl"), self._ruta(nombre, ".json")
+        if os.path.exists(ruta_meta):
+            os.remove(ruta_meta)
+
+        with open(ruta_pkl + ".tmp", "wb") as fh:
+            pickle.dump(salida, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(ruta_pkl + ".tmp", ruta_pkl)
+
+        with open(ruta_meta + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump({"clave": clave, "huella": huella, "filas": filas, "destino": destino}, fh)
+        os.replace(ruta_meta + ".tmp", ruta_meta)
+
+    def _salida(self, nombre):
+        """
+        Salida de una etapa; si se omitió se carga del checkpoint recién ahora.
+        Un pickle ausente o ilegible cuenta como checkpoint inválido y la
+        etapa se vuelve a ejecutar.
+        """
+        if nombre not in self._salidas:
+            try:
+                with open(self._ruta(nombre, ".pkl"), "rb") as fh:
+                    self._salidas[nombre] = pickle.load(fh)
+            except Exception as e:
+                with self._lock:
+                    if nombre not in self._salidas:
+                        print(f"⚠️ Checkpoint de {nombre} ilegible ({e}), se re-ejecuta la etapa.")
+                        etapa = self.etapas[nombre]
+                        self._ejecutar_etapa(etapa, self._clave(etapa))
+        return self._salidas[nombre]
+
+    # --- ejecución ---
+    def _clave(self, etapa):
+        h = hashlib.sha256(f"{etapa.nombre}|v{etapa.version}".encode("utf-8"))
+        for e in etapa.entradas:
+            h.update(str(self._huellas.get(e)).encode("utf-8"))
+        if etapa.huella is not None:
+            h.update(str(etapa.huella()).encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def _estado_destino(etapa):
+        try:
+            estado = etapa.destino()
+        except Exception as e:
+            print(f"⚠️ No se pudo verificar el destino de {etapa.nombre}: {e}")
+            return None
+        return None if estado is None else str(estado)
+
+    def _destino_intacto(self, etapa, meta):
+        """Sin `destino` siempre vale; si lo hay, debe seguir como quedó."""
+        if etapa.destino is None:
+            return True
+        estado = self._estado_destino(etapa)
+        return estado is not None and estado == meta.get("destino")
+
+    def _ejecutar_etapa(self, etapa, clave):
+        """Corre la etapa con las salidas de sus entradas y guarda el checkpoint."""
+        args = [self._salida(e) if self._huellas.get(e) is not None else None for e in etapa.entradas]
+        salida = etapa.funcion(*args)
+        huella = huella_contenido(salida)
+        filas = len(salida) if isinstance(salida, pd.DataFrame) else None
+        destino = self._estado_destino(etapa) if etapa.destino is not None else None
+        self._guardar(etapa.nombre, clave, salida, huella, filas, destino)
+        self._salidas[etapa.nombre] = salida
+        self._huellas[etapa.nombre] = huella
+        return filas
+
+    def _correr(self, etapa):
+        t0 = time.perf_counter()
+        try:
+            clave = self._clave(etapa)
+            meta = self._leer_meta(etapa.nombre)
+            if (
+                not self.forzar and meta and meta["clave"] == clave
+                and os.path.exists(self._ruta(etapa.nombre, ".pkl"))
+                and self._destino_intacto(etapa, meta)
+            ):
+                self._huellas[etapa.nombre] = meta["huella"]
+                estado, filas = "checkpoint", meta["filas"]
+            else:
+                filas = self._ejecutar_etapa(etapa, clave)
+                estado = "ejecutada"
+        except Exception as e:
+            if not etapa.opcional:
+                raise
+            print(f"⚠️ Error en etapa {etapa.nombre}: {e}")
+            self._huellas[etapa.nombre] = None
+            estado, filas = "error", None
+
+        self.metricas.append({
+            "etapa": etapa.nombre,
+            "estado": estado,
+            "segundos": round(time.perf_counter() - t0, 3),
+            "filas": filas,
+        })
+
+    def ejecutar(self, objetivo):
+        """
+        Corre el grafo por oleadas: todas las etapas cuyas entradas ya están
+        resueltas van en paralelo (p. ej. extraer/limpiar de cada tabla).
+        Devuelve la salida de `objetivo`.
+        """
+        pendientes = dict(self.etapas)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pendientes:
+                listas = [
+                    e for e in pendientes.values()
+                    if all(dep in self._huellas for dep in e.entradas)
+                ]
+                if not listas:
+                    raise RuntimeError(f"Dependencias sin resolver: {list(pendientes)}")
+                list(pool.map(self._correr, listas))
+                for e in listas:
+                    del pendientes[e.nombre]
+
+        self.imprimir_resumen()
+        return self._salida(objetivo) if self._huellas.get(objetivo) is not None else None
+
+    def imprimir_resumen(self):
+        print("\n⏱️ Resumen de etapas:")
+        for m in self.metricas:
+            filas = "-" if m["filas"] is None else f"{m['filas']:,}"
+            print(f"   {m['etapa']:<38} {m['estado']:<11} {m['segundos']:>8.3f}s  {filas:>10} filas")
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from mysql.connector import Error, errorcode
+from conexion_mysql import crear_conexion
+from esquema_master import ARCHIVO_FEATHER
+
+# ======================================================
+# === OBL DIGITAL — Refresco en caliente del dataset ===
+# ======================================================
+
+TABLA_VERSION = "CMN_MASTER_VERSION"
+CSV_RESPALDO = "CMN_MASTER_preview.csv"
+ARCHIVOS_RESPALDO = [ARCHIVO_FEATHER, CSV_RESPALDO]
+INTERVALO_REFRESCO_S = int(os.environ.get("INTERVALO_REFRESCO_S", "30"))
+
+
+def leer_version(conexion=None):
+    """
+    Devuelve la firma publicada por el ETL: (version, checksum).
+    Es una sola consulta de una fila; si MySQL no responde se usa
+    la fecha/tamaño del Feather y el CSV locales como firma de respaldo.
+    Si la tabla aún no existe (deploy antes del primer ETL nuevo) no hay
+    versión publicada: (None, None).
+    """
+    if conexion is not None:
+        cursor = conexion.cursor()
+        try:
+            cursor.execute(f"SELECT version, checksum FROM {TABLA_VERSION} WHERE id = 1")
+            fila = cursor.fetchone()
+        except Error as e:
+            if e.errno == errorcode.ER_NO_SUCH_TABLE:
+                return None, None
+            raise
+        finally:
+            cursor.close()
+        if fila:
+            return int(fila[0]), str(fila[1])
+
+    firma = []
+    for ruta in ARCHIVOS_RESPALDO:
+        if os.path.exists(ruta):
+            st = os.stat(ruta)
+            firma.append(f"{ruta}:{st.st_mtime_ns}:{st.st_size}")
+    return None, ("|".join(firma) or None)
+
+
+class DatasetVivo:
+    """
+    Mantiene el estado procesado del dashboard y lo reemplaza de forma
+    atómica cuando el ETL publica una nueva versión.
+
+    `construir` es una función sin argumentos que devuelve el estado
+    completo (dict). Los callbacks leen siempre `snapshot()` una sola vez
+    al inicio, así nunca mezclan datos de dos versiones.
+    """
+
+    def __init__(self, construir, intervalo=INTERVALO_REFRESCO_S):
+        self._construir = construir
+        self._intervalo = intervalo
+        self._conexion = None
+        self._firma = None
+        self._snapshot = (0, None)  # (data_version, estado)
+        self._hilo = None
+
+    # --- lectura ---
+    def snapshot(self):
+        """(data_version, estado) vigentes; la tupla se reemplaza entera."""
+        return self._snapshot
+
+    @property
+    def data_version(self):
+        return self._snapshot[0]
+
+    # --- firma del ETL ---
+    def _leer_firma(self):
+        try:
+            if self._conexion is None:
+                self._conexion = crear_conexion(silencioso=True)
+                if self._conexion is not None:
+                    # Conexión larga: sin autocommit, InnoDB (REPEATABLE READ)
+                    # fija el snapshot en el primer SELECT y cada sondeo
+                    # vería siempre la misma versión.
+                    self._conexion.autocommit = True
+            return leer_version(self._conexion)
+        except Exception as e:
+            print(f"⚠️ Error leyendo {TABLA_VERSION}: {e}")
+            # Solo se reconecta si se cayó la conexión, no por un error de consulta
+            try:
+                if self._conexion is not None and not self._conexion.is_connected():
+                    self._conexion.close()
+                    self._conexion = None
+            except Exception:
+                self._conexion = None
+            return None
+
+    # --- reconstrucción ---
+    def recargar(self):
+        """
+        Reconstruye el estado y lo publica. Si la firma cambia mientras se
+        construye (el ETL volvió a escribir) se descarta y se reintenta,
+        para no publicar nunca un estado armado con datos parciales.
+        """
+        for _ in range(3):
+            firma_antes = self._leer_firma()
+            estado = self._construir()
+            firma_despues = self._leer_firma()
+            if firma_antes == firma_despues:
+                self._firma = firma_despues
+                self._snapshot = (self._snapshot[0] + 1, estado)
+                print(f"🔄 Dataset publicado (data_version={self._snapshot[0]}, firma={self._firma})")
+                return True
+            print("⚠️ El ETL cambió los datos durante la carga, reintentando...")
+
+        if self._snapshot[1] is None:
+            # Arranque: mejor servir la última carga que no servir nada
+            self._firma = firma_despues
+            self._snapshot = (1, estado)
+            return True
+        return False
+
+    def verificar(self):
+        """Un ciclo de sondeo: si la firma no cambió solo cuesta una consulta."""
+        firma = self._leer_firma()
+        if firma is None or firma == (None, None) or firma == self._firma:
+            return False
+        print(f"🆕 Nueva versión detectada: {firma}")
+        return self.recargar()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self._intervalo)
+            try:
+                self.verificar()
+            except Exception as e:
+                print(f"⚠️ Error refrescando dataset: {e}")
+
+    def iniciar(self):
+        """Carga inicial síncrona y arranque del hilo de sondeo."""
+        if self._snapshot[1] is None:
+            self.recargar()
+        if self._intervalo > 0 and self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="refresco-dataset", daemon=True)
+            self._hilo.start()
+        return self
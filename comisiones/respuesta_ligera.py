@@ -0,0 +1,142 @@
+import gzip
+import json
+import time
+import brotli
+import plotly.graph_objects as go
+import plotly.io as pio
+from flask_compress import Compress
+
+# ======================================================
+# === OBL DIGITAL — Respuestas livianas del dashboard ===
+# ======================================================
+
+# === Compresión HTTP (callbacks JSON, assets JS/CSS e index) ===
+def configurar_compresion(server):
+    server.config.update(
+        COMPRESS_ALGORITHM=["br", "gzip"],
+        COMPRESS_MIMETYPES=[
+            "application/json",
+            "application/javascript",
+            "text/javascript",
+            "text/css",
+            "text/html",
+        ],
+        COMPRESS_LEVEL=6,
+        COMPRESS_BR_LEVEL=5,
+        COMPRESS_MIN_SIZE=500,
+    )
+    Compress(server)
+
+
+# === Plantilla plotly mínima ===
+# La plantilla "plotly" por defecto viaja completa dentro de cada figura
+# (~9 KB de JSON). Esta solo lleva lo que el dashboard realmente usa.
+PLANTILLA_OBL = "obl"
+pio.templates[PLANTILLA_OBL] = go.layout.Template(
+    layout=dict(
+        paper_bgcolor="#0d0d0d",
+        plot_bgcolor="#0d0d0d",
+        font=dict(color="#f2f2f2"),
+        title=dict(font=dict(color="#D4AF37")),
+        xaxis=dict(gridcolor="#333333", zerolinecolor="#333333", automargin=True),
+        yaxis=dict(gridcolor="#333333", zerolinecolor="#333333", automargin=True),
+        hovermode="closest",
+    )
+)
+
+
+def figura_ligera(fig):
+    """
+    Figura como dict JSON puro: se serializa una vez al calcular la vista
+    (y queda en caché) en lugar de revalidarse en cada respuesta.
+    """
+    return json.loads(pio.to_json(fig, validate=False))
+
+
+# === Tabla paginada en el servidor ===
+def pagina_tabla(df_tabla, page_current, page_size, sort_by=None):
+    """
+    Registros de una sola página (page_action="custom"). Ordena sobre los
+    valores numéricos y formatea solo las filas que se envían.
+    """
+    if df_tabla is None or df_tabla.empty:
+        return []
+
+    if sort_by:
+        df_tabla = df_tabla.sort_values(
+            [s["column_id"] for s in sort_by],
+            ascending=[s["direction"] == "asc" for s in sort_by],
+            kind="stable",
+        )
+
+    inicio = (page_current or 0) * page_size
+    pagina = df_tabla.iloc[inicio:inicio + page_size].copy()
+
+    pagina["date"] = pagina["date"].dt.strftime("%Y-%m-%d")
+    pagina["comm_pct"] = pagina["comm_pct"].apply(lambda x: f"{x*100:.2f}%")
+    pagina["commission_usd"] = pagina["commission_usd"].round(2)
+    return pagina.astype(object).where(pagina.notna(), None).to_dict("records")
+
+
+# ==========================
+# MEDICIÓN DE PAYLOADS
+# ==========================
+
+def medir_payload(cuerpo, mbps=5.0):
+    """Tamaño crudo / gzip / brotli y tiempo de transferencia estimado."""
+    crudo = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode("utf-8")
+    tamanos = {
+        "crudo": len(crudo),
+        "gzip": len(gzip.compress(crudo, 6)),
+        "br": len(brotli.compress(crudo, quality=5)),
+    }
+    return {k: (v, v * 8 / (mbps * 1e6) * 1000) for k, v in tamanos.items()}
+
+
+def reporte_payloads(mbps=5.0):
+    """
+    Calcula la vista para selecciones típicas y muestra tamaños/tiempos
+    antes (figura con plantilla por defecto + tabla completa) y después
+    (figura ligera + una página de tabla).
+    """
+    import plotly.express as px
+    import dashboard_comisiones as dc
+
+    estado = dc.dataset.snapshot()[1]
+    df = estado["df"]
+    agentes = df["agent"].dropna().value_counts().index.tolist()
+    mes = df["date"].max().to_period("M")
+    selecciones = {
+        "vista inicial": (None, None, estado["fecha_min"], estado["fecha_max"]),
+        "1 agente, todo el rango": (None, agentes[:1], estado["fecha_min"], estado["fecha_max"]),
+        "5 agentes, último mes": (None, agentes[:5], mes.start_time, mes.end_time),
+    }
+
+    for nombre, (rtn, ftd, desde, hasta) in selecciones.items():
+        vista = dc.calcular_vista(estado, rtn, ftd, desde, hasta, dc.TC_DEFAULT)
+        tabla = vista["tabla"]
+
+        fig_antes = px.bar(
+            tabla.groupby("agent", as_index=False)["commission_usd"].sum(),
+            x="agent", y="commission_usd", color="commission_usd",
+        )
+        antes = {
+            "figure": json.loads(pio.to_json(fig_antes)),
+            "data": json.loads(tabla.assign(date=tabla["date"].astype(str)).to_json(orient="records")),
+        }
+        despues = {
+            "figure": vista["figura"],
+            "data": pagina_tabla(tabla, 0, dc.TAMANO_PAGINA),
+        }
+
+        print(f"\n📦 {nombre} ({len(tabla):,} filas, {mbps} Mbps)")
+        for etiqueta, cuerpo in (("antes", antes), ("después", despues)):
+            t0 = time.perf_counter()
+            medidas = medir_payload(json.dumps(cuerpo, default=str).encode("utf-8"), mbps)
+            ms_cpu = (time.perf_counter() - t0) * 1000
+            texto = "  ".join(f"{k}={b:,} B ({ms:.1f} ms)" for k, (b, ms) in medidas.items())
+            print(f"   {etiqueta:<8} {texto}  [compresión {ms_cpu:.1f} ms]")
+
+
+if __name__ == "__main__":
+    reporte_payloads()
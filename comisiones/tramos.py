@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# === OBL DIGITAL — Tramos de comisión FTD / RTN     ===
+# ======================================================
+
+# FTD: n-ésima venta del mes → porcentaje (1-3, 4-7, 8-12, 13-17, 18-21, 22+)
+LIMITES_FTD = np.array([1, 4, 8, 13, 18, 22])
+PCT_FTD = np.array([0.0, 0.10, 0.17, 0.19, 0.22, 0.25, 0.30])
+
+# RTN: total neto → porcentaje (límites superiores inclusivos)
+LIMITES_RTN = np.array([25000, 50000, 75000, 101000, 151000])
+PCT_RTN = np.array([0.05, 0.06, 0.075, 0.09, 0.10, 0.12])
+
+
+def porcentaje_tramo_progresivo(n_venta):
+    if 1 <= n_venta <= 3:
+        return 0.10
+    elif 4 <= n_venta <= 7:
+        return 0.17
+    elif 8 <= n_venta <= 12:
+        return 0.19
+    elif 13 <= n_venta <= 17:
+        return 0.22
+    elif 18 <= n_venta <= 21:
+        return 0.25
+    elif n_venta >= 22:
+        return 0.30
+    return 0.0
+
+def porcentaje_rtn_progresivo(usd_total):
+    if usd_total <= 25000:
+        return 0.05
+    elif usd_total <= 50000:
+        return 0.06
+    elif usd_total <= 75000:
+        return 0.075
+    elif usd_total <= 101000:
+        return 0.09
+    elif usd_total <= 151000:
+        return 0.10
+    else:
+        return 0.12
+
+
+def pct_tramo_ftd(n_ventas):
+    """
+    Versión vectorizada de porcentaje_tramo_progresivo. searchsorted manda
+    NaN al final (tramo 30%); las filas sin agente tienen ftd_num NaN y el
+    escalar les da 0.0, así que NaN y < 1 se fijan a 0.0 explícitamente.
+    """
+    n = np.asarray(n_ventas, dtype=float)
+    pct = PCT_FTD[np.searchsorted(LIMITES_FTD, n, side="right")]
+    return np.where(np.isnan(n) | (n < 1), 0.0, pct)
+
+
+def pct_tramo_rtn(usd_totales):
+    """Versión vectorizada de porcentaje_rtn_progresivo."""
+    return PCT_RTN[np.searchsorted(LIMITES_RTN, np.asarray(usd_totales, dtype=float), side="left")]
+
+
+class MotorTramos:
+    """
+    Recalcula el tramo RTN para cualquier subconjunto de agentes y ventana
+    de fechas sin volver a recorrer el frame.
+
+    Al construirse ordena las filas RTN por (agente, fecha) y guarda la suma
+    acumulada de usd_neto; cada agente ocupa un tramo contiguo [ini, fin).
+    Una ventana se resuelve con dos búsquedas binarias por agente y una
+    resta de acumulados, o sea O(agentes · log n) por consulta.
+
+    El tramo FTD no depende de la ventana: `ftd_num` se reinicia por mes en
+    la carga y la ventana no renumera, solo elige qué ventas entran, así
+    que el comm_pct FTD de cada fila ya es el definitivo.
+    """
+
+    def __init__(self, df):
+        rtn = df[df["type"].astype(str).str.upper() == "RTN"]
+        orden = rtn.assign(_agente=rtn["agent"].fillna("")).sort_values(["_agente", "date"], kind="stable")
+        self._fechas = orden["date"].values.astype("datetime64[ns]").astype("int64")
+        self._cum_neto = np.concatenate([[0.0], np.cumsum(orden["usd_neto"].fillna(0).to_numpy(dtype=float))])
+
+        self._tramos = {}
+        for agente, pos in orden.groupby("_agente", sort=False).indices.items():
+            self._tramos[agente] = (int(pos[0]), int(pos[-1]) + 1)
+        self._agentes = sorted(self._tramos)
+
+    def _ventana(self, agente, desde, hasta):
+        """Posiciones [lo, hi) del agente dentro de la ventana (extremos inclusivos)."""
+        ini, fin = self._tramos.get(agente, (0, 0))
+        fechas = self._fechas[ini:fin]
+        lo = ini if desde is None else ini + int(np.searchsorted(fechas, desde, side="left"))
+        hi = fin if hasta is None else ini + int(np.searchsorted(fechas, hasta, side="right"))
+        return lo, max(hi, lo)
+
+    @staticmethod
+    def _ns(fecha):
+        return None if fecha is None else pd.Timestamp(fecha).value
+
+    def total_rtn(self, agentes=None, desde=None, hasta=None):
+        """(filas, usd_neto) RTN de la ventana; base del tramo RTN post-filtro."""
+        d, h = self._ns(desde), self._ns(hasta)
+        filas, neto = 0, 0.0
+        for agente in (set(agentes) if agentes else self._agentes):
+            lo, hi = self._ventana(agente, d, h)
+            filas += hi - lo
+            neto += self._cum_neto[hi] - self._cum_neto[lo]
+        return filas, neto
+
+    def pct_rtn(self, agentes=None, desde=None, hasta=None):
+        """Tramo RTN único para la ventana, igual que el recálculo del callback."""
+        filas, neto = self.total_rtn(agentes, desde, hasta)
+        return (porcentaje_rtn_progresivo(neto) if filas else None), neto
+
+
+# ==========================
+# PARIDAD VECTORIZADO / ESCALAR
+# ==========================
+
+def verificar_paridad():
+    """Compara pct_tramo_* contra las funciones escalares originales."""
+    ftds = np.array([np.nan, -1, 0, *range(1, 31), 100], dtype=float)
+    esperado = np.array([porcentaje_tramo_progresivo(n) for n in ftds])
+    assert np.array_equal(pct_tramo_ftd(ftds), esperado), "pct_tramo_ftd difiere del escalar"
+
+    limites = np.concatenate([LIMITES_RTN, LIMITES_RTN + 0.01, LIMITES_RTN - 0.01])
+    usd = np.array([np.nan, -500, 0, *limites, 1e6], dtype=float)
+    esperado = np.array([porcentaje_rtn_progresivo(u) for u in usd])
+    assert np.array_equal(pct_tramo_rtn(usd), esperado), "pct_tramo_rtn difiere del escalar"
+
+    print(f"✅ Tramos vectorizados = escalares ({len(ftds)} FTD, {len(usd)} RTN)")
+
+
+if __name__ == "__main__":
+    verificar_paridad()
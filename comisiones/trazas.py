@@ -0,0 +1,166 @@
+import contextvars
+import functools
+import html
+import inspect
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# ======================================================
+# === OBL DIGITAL — Trazas de latencia por callback  ===
+# ======================================================
+#
+# Cada callback decorado con @trazar_callback abre una traza; dentro,
+# `with span("nombre"):` mide cada sub-paso. Se guarda un histograma
+# móvil por callback y, si el total supera UMBRAL_LENTO_MS, una entrada
+# de "request lento" con los filtros que la dispararon.
+
+UMBRAL_LENTO_MS = float(os.environ.get("UMBRAL_LENTO_MS", "500"))
+MUESTRAS_POR_CALLBACK = 500
+MAX_TRAZAS_RECIENTES = 200
+LIMITES_HISTOGRAMA_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+RUTA_DEBUG = "/debug/callbacks"
+# La página expone filtros recientes (nombres de agentes): solo se
+# registra si se pide explícitamente, nunca por defecto en producción.
+DEBUG_TRAZAS = os.environ.get("DEBUG_TRAZAS", "0") == "1"
+
+_traza_actual = contextvars.ContextVar("traza_actual", default=None)
+_lock = threading.Lock()
+_muestras = defaultdict(lambda: deque(maxlen=MUESTRAS_POR_CALLBACK))
+_recientes = deque(maxlen=MAX_TRAZAS_RECIENTES)
+_lentas = deque(maxlen=MAX_TRAZAS_RECIENTES)
+
+
+@contextmanager
+def span(nombre):
+    """Mide un sub-paso; sin traza activa (p. ej. hilo de refresco) no registra nada."""
+    traza = _traza_actual.get()
+    if traza is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza["spans"].append((nombre, (time.perf_counter() - t0) * 1000))
+
+
+def trazar_callback(nombre):
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            traza = {"callback": nombre, "spans": [], "inicio": time.time()}
+            token = _traza_actual.set(traza)
+            t0 = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _traza_actual.reset(token)
+                traza["total_ms"] = (time.perf_counter() - t0) * 1000
+                try:
+                    traza["filtros"] = dict(firma.bind(*args, **kwargs).arguments)
+                except TypeError:
+                    traza["filtros"] = {"args": args, "kwargs": kwargs}
+                registrar(traza)
+
+        return envoltura
+    return decorador
+
+
+def registrar(traza):
+    with _lock:
+        _muestras[traza["callback"]].append(traza["total_ms"])
+        _recientes.append(traza)
+        if traza["total_ms"] >= UMBRAL_LENTO_MS:
+            _lentas.append(traza)
+        else:
+            return
+
+    detalle = ", ".join(f"{n}={ms:.1f}ms" for n, ms in traza["spans"])
+    print(f"🐢 Callback lento {traza['callback']}: {traza['total_ms']:.1f} ms "
+          f"| filtros={traza['filtros']} | {detalle}")
+
+
+def histograma(callback):
+    """Conteo por bucket (≤ límite en ms) y percentiles de las últimas muestras."""
+    with _lock:
+        muestras = sorted(_muestras.get(callback, ()))
+    conteo = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+    for ms in muestras:
+        i = next((k for k, lim in enumerate(LIMITES_HISTOGRAMA_MS) if ms <= lim), len(LIMITES_HISTOGRAMA_MS))
+        conteo[i] += 1
+
+    def percentil(p):
+        return muestras[min(len(muestras) - 1, int(p * len(muestras)))] if muestras else 0.0
+
+    return {"n": len(muestras), "p50": percentil(0.50), "p95": percentil(0.95), "max": percentil(1.0), "buckets": conteo}
+
+
+def mas_lentas(n=25):
+    """Las más lentas entre las recientes y las que superaron el umbral."""
+    with _lock:
+        trazas = {id(t): t for t in (*_lentas, *_recientes)}
+    return sorted(trazas.values(), key=lambda t: t["total_ms"], reverse=True)[:n]
+
+
+# ==========================
+# PÁGINA DE DEBUG
+# ==========================
+
+def registrar_pagina_debug(server, habilitada=DEBUG_TRAZAS):
+    """GET /debug/callbacks: histogramas y callbacks más lentos recientes (con DEBUG_TRAZAS=1)."""
+    if not habilitada:
+        # Sin esta ruta el catch-all de Dash (/<path:path>) serviría el index con 200
+        @server.route(RUTA_DEBUG)
+        def pagina_debug_deshabilitada():
+            return "Not Found", 404
+
+        return pagina_debug_deshabilitada
+
+    @server.route(RUTA_DEBUG)
+    def pagina_debug():
+        e = html.escape
+        filas_hist = []
+        with _lock:
+            callbacks = sorted(_muestras)
+        for cb in callbacks:
+            h = histograma(cb)
+            celdas = "".join(f"<td>{c}</td>" for c in h["buckets"])
+            filas_hist.append(
+                f"<tr><td>{e(cb)}</td><td>{h['n']}</td><td>{h['p50']:.1f}</td>"
+                f"<td>{h['p95']:.1f}</td><td>{h['max']:.1f}</td>{celdas}</tr>"
+            )
+        cab_buckets = "".join(f"<th>≤{lim}</th>" for lim in LIMITES_HISTOGRAMA_MS) + "<th>&gt;</th>"
+
+        filas_lentas = []
+        for t in mas_lentas():
+            spans = "<br>".join(f"{e(n)}: {ms:.1f} ms" for n, ms in t["spans"])
+            filas_lentas.append(
+                f"<tr><td>{time.strftime('%H:%M:%S', time.localtime(t['inicio']))}</td>"
+                f"<td>{e(t['callback'])}</td><td>{t['total_ms']:.1f}</td>"
+                f"<td>{e(str(t['filtros']))}</td><td>{spans}</td></tr>"
+            )
+
+        filas_hist = "".join(filas_hist)
+        filas_lentas = "".join(filas_lentas)
+
+        return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>OBL Digital — Latencia de callbacks</title>
+<style>
+  body {{ background:#0d0d0d; color:#f2f2f2; font-family:Poppins, Arial; padding:20px; }}
+  h2 {{ color:#D4AF37; }}
+  table {{ border-collapse:collapse; margin-bottom:30px; font-size:12px; }}
+  th {{ background:#D4AF37; color:#000; padding:4px 8px; }}
+  td {{ background:#1a1a1a; padding:4px 8px; vertical-align:top; }}
+</style></head><body>
+<h2>⏱️ Histograma por callback (ms, últimas {MUESTRAS_POR_CALLBACK})</h2>
+<table><tr><th>callback</th><th>n</th><th>p50</th><th>p95</th><th>max</th>{cab_buckets}</tr>{filas_hist}</table>
+<h2>🐢 Callbacks más lentos recientes (umbral de log: {UMBRAL_LENTO_MS:.0f} ms)</h2>
+<table><tr><th>hora</th><th>callback</th><th>total ms</th><th>filtros</th><th>spans</th></tr>{filas_lentas}</table>
+</body></html>"""
+
+    return pagina_debug